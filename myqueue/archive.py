@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import time
+
+from myqueue.pretty import pprint
+from myqueue.queue import Queue
+from myqueue.resources import T
+from myqueue.states import State
+from myqueue.task import Task
+from myqueue.utils import plural
+
+
+def archive(queue: Queue,
+            tasks: list[Task],
+            verbosity: int = 1,
+            older_than: str = None) -> None:
+    """Move finished tasks to the archive.
+
+    Only tasks that stopped more than *older_than* ago (example: "7d")
+    are archived if *older_than* is given.
+    """
+    tmax = time.time() - T(older_than) if older_than else float('inf')
+    tasks = [task for task in tasks
+             if not task.state.is_active() and task.tstop < tmax]
+
+    if queue.dry_run:
+        if tasks:
+            pprint(tasks, verbosity=0, sort='i')
+            print(plural(len(tasks), 'task'), 'to be archived')
+    else:
+        n = queue.archive(task.id for task in tasks)
+        if verbosity > 0:
+            if tasks:
+                pprint(tasks, verbosity=0, sort='i')
+                print(plural(n, 'task'), 'archived')
+
+
+def archive_old_tasks(queue: Queue) -> dict[str, int]:
+    """Archive tasks according to the *archive_policy* configuration.
+
+    The policy maps state letters to ages.  Example::
+
+        {'d': '7d', 'FCTM': '30d'}
+
+    will archive done tasks a week after they stopped and failed tasks
+    after 30 days.
+    """
+    policy = queue.config.archive_policy
+    if not policy:
+        return {}
+    t = time.time()
+    ids: list[int] = []
+    for letters, age in policy.items():
+        states = [state.value for state in State.str2states(letters)
+                  if not state.is_active()]
+        q = ', '.join('?' * len(states))
+        ids += [id for id, in queue.sql(
+            f'SELECT id FROM tasks WHERE state IN ({q}) '
+            'AND user = ? AND tstop < ?',
+            [*states, queue.config.user, t - T(age)])]
+    if queue.dry_run:
+        return {'archived': len(ids)}
+    return {'archived': queue.archive(ids)}
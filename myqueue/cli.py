@@ -1,7 +1,6 @@
 from __future__ import annotations
 
 import argparse
-import importlib.metadata
 import os
 import sys
 import textwrap
@@ -75,6 +74,17 @@ Examples:
 
     $ mq remove -i 4321,4322  # remove jobs with ids 4321 and 4322
     $ mq rm -s d . -r  # remove done jobs in this folder and its subfolders
+"""),
+    ('archive',
+     'Move finished tasks to the archive.', """
+Archived tasks are no longer in the queue, but they can still be listed
+with "mq list --archived" and workflows will see archived done tasks as
+done.
+
+Examples:
+
+    $ mq archive -s d . -r  # archive done jobs in this folder and below
+    $ mq archive -s A --older-than 30d  # archive old failed jobs
 """),
     ('info',
      'Show detailed information about MyQueue or a task.', """
@@ -292,8 +302,13 @@ def _main(arguments: list[str] = None) -> int:
               help='Pass arguments to workflow() function.  Example: '
               '"-a name=hello,n=5" will call '
               "workflow(name='hello', n=5).")
+            a('-j', '--jobs', type=int, default=1, metavar='N',
+              help='Collect tasks from folders using N processes.')
+            a('--incremental', action='store_true',
+              help='Skip folders where nothing has changed since last '
+              'time.')
 
-        if cmd in ['list', 'remove', 'resubmit', 'modify']:
+        if cmd in ['list', 'remove', 'resubmit', 'modify', 'archive']:
             a('-s', '--states', metavar='qhrdFCTMaA',
               help='Selection of states. First letters of "queued", "hold", '
               '"running", "done", "FAILED", "CANCELED", "TIMEOUT", '
@@ -318,8 +333,14 @@ def _main(arguments: list[str] = None) -> int:
               'Use "-S c-" for a descending sort.')
             a('-C', '--count', action='store_true',
               help='Just show the number of tasks.')
+            a('--limit', type=int, default=-1, metavar='N',
+              help='Show at most N tasks.')
+            a('--offset', type=int, default=0, metavar='N',
+              help='Skip the first N tasks.')
             a('--not-recursive', action='store_true',
               help='Do not list subfolders.')
+            a('--archived', action='store_true',
+              help='List archived tasks instead of tasks in the queue.')
             a('folder',
               nargs='*',
               help='List tasks in this folder and its subfolders.  '
@@ -336,7 +357,12 @@ def _main(arguments: list[str] = None) -> int:
         a('-T', '--traceback', action='store_true',
           help='Show full traceback.')
 
-        if cmd in ['remove', 'resubmit', 'modify']:
+        if cmd == 'archive':
+            a('--older-than', metavar='AGE',
+              help='Only archive tasks that stopped more than AGE ago.  '
+              'Examples: "12h", "7d".')
+
+        if cmd in ['remove', 'resubmit', 'modify', 'archive']:
             a('-r', '--recursive', action='store_true',
               help='Use also subfolders.')
             a('folder',
@@ -373,6 +399,7 @@ def _main(arguments: list[str] = None) -> int:
         f.mkdir()
 
     if args.version:
+        import importlib.metadata
         print('Version:', importlib.metadata.version('myqueue'))
         print('Code:   ', Path(__file__).parent)
         return 0
@@ -411,9 +438,11 @@ def _main(arguments: list[str] = None) -> int:
     except TimeoutError as x:
         lockfile = x.args[0]
         age = time() - lockfile.stat().st_mtime
-        error(f'Locked {age:.0f} seconds ago:', lockfile)
+        owner = lockfile.read_text().strip()
+        error(f'Locked {age:.0f} seconds ago by {owner}:', lockfile)
         if age > 60:
-            error('Try removing the file and report this to the developers!')
+            error(f'Check that process {owner} is still running and '
+                  'report this to the developers!')
     except MQError as x:
         error(*x.args)
         return 1
@@ -432,14 +461,10 @@ def _main(arguments: list[str] = None) -> int:
 def run(args: argparse.Namespace, is_test: bool) -> None:
     from myqueue.config import Configuration, find_home_folder
     from myqueue.daemon import perform_daemon_action, start_daemon
-    from myqueue.pretty import pprint
     from myqueue.queue import Queue
-    from myqueue.resources import Resources
     from myqueue.selection import Selection
     from myqueue.states import State
-    from myqueue.task import task
     from myqueue.utils import mqhome
-    from myqueue.workflow import prune, workflow
 
     verbosity = 1 - args.quiet + args.verbose
 
@@ -475,7 +500,7 @@ def run(args: argparse.Namespace, is_test: bool) -> None:
         info_all(folders[0])
         return
 
-    if args.command in ['remove', 'resubmit', 'modify']:
+    if args.command in ['remove', 'resubmit', 'modify', 'archive']:
         if not folders:
             if args.id:
                 folders = [Path.cwd()]
@@ -519,7 +544,7 @@ def run(args: argparse.Namespace, is_test: bool) -> None:
     if args.command in ['submit', 'resubmit']:
         config.extra_args += args.extra_scheduler_args
 
-    if args.command in ['list', 'remove', 'resubmit', 'modify']:
+    if args.command in ['list', 'remove', 'resubmit', 'modify', 'archive']:
         default = 'qhrdFCTM' if args.command == 'list' else ''
         states = State.str2states(args.states
                                   if args.states is not None
@@ -552,22 +577,51 @@ def run(args: argparse.Namespace, is_test: bool) -> None:
     need_lock = args.command not in ['list', 'info'] and not dry_run
     with Queue(config, need_lock=need_lock, dry_run=dry_run) as queue:
         if args.command == 'list':
-            reverse = args.sort.endswith('-')
-            column = args.sort.rstrip('-')
-            tasks = queue.select(selection)
-            pprint(tasks,
-                   verbosity=verbosity,
-                   columns=args.columns,
-                   short=args.count,
-                   sort=column,
-                   reverse=reverse)
+            if args.count:
+                from myqueue.pretty import print_count
+                count = queue.count(selection, args.archived)
+                if verbosity > 0 and count:
+                    count['total'] = sum(count.values())
+                    print_count(count)
+            else:
+                from myqueue.pretty import pprint, pprint_stream, sql_columns
+                from myqueue.selection import sql_order_statement
+                reverse = args.sort.endswith('-')
+                column = args.sort.rstrip('-')
+                columns = sql_columns(args.columns, column)
+                order = sql_order_statement(column, reverse)
+                if order:
+                    # Let SQLite sort and print tasks while reading them:
+                    where, sqlargs = selection.sql_where_statement(
+                        queue.folder.parent)
+                    with queue.connection:
+                        pprint_stream(
+                            queue.iter_tasks(where, sqlargs, columns, order,
+                                             args.limit, args.offset,
+                                             args.archived),
+                            verbosity=verbosity,
+                            columns=args.columns)
+                else:
+                    tasks = queue.select(selection, columns, args.archived)
+                    tasks.sort(key=lambda task: task.order_key(column),
+                               reverse=reverse)
+                    end = None if args.limit < 0 else args.offset + args.limit
+                    pprint(tasks[args.offset:end],
+                           verbosity=verbosity,
+                           columns=args.columns)
 
         elif args.command == 'remove':
             from myqueue.remove import remove
             tasks = queue.select(selection)
             remove(queue, tasks, verbosity, args.force)
 
+        elif args.command == 'archive':
+            from myqueue.archive import archive
+            tasks = queue.select(selection)
+            archive(queue, tasks, verbosity, args.older_than)
+
         elif args.command == 'resubmit':
+            from myqueue.resources import Resources
             from myqueue.resubmit import resubmit
             resources: Resources | None
             if args.resources:
@@ -579,6 +633,7 @@ def run(args: argparse.Namespace, is_test: bool) -> None:
 
         elif args.command == 'submit':
             from myqueue.submitting import submit
+            from myqueue.task import task
             newtasks = [task(args.task,
                              resources=args.resources,
                              name=args.name,
@@ -600,12 +655,24 @@ def run(args: argparse.Namespace, is_test: bool) -> None:
 
         elif args.command == 'workflow':
             from myqueue.submitting import submit
-            tasks = workflow(args, folders, verbosity)
+            from myqueue.workflow import prune, str2kwargs, workflow
+            if queue.config.workflow_cache:
+                cache_dir = queue.config.home / '.myqueue' / 'workflow-cache'
+            else:
+                cache_dir = None
+            manifests = None
+            if args.incremental:
+                from myqueue.manifests import Manifests
+                kwargs = str2kwargs(args.arguments) if args.arguments else {}
+                manifests = Manifests(queue, kwargs, force=args.force)
+            tasks = workflow(args, folders, verbosity, cache_dir, manifests)
             tasks, done = prune(tasks, queue, args.force)
             try:
                 submit(queue, tasks, done=done, max_tasks=args.max_tasks)
             except Exception as ex:
                 raise MQError(ex.args)
+            if manifests is not None:
+                manifests.save()
 
         elif args.command == 'sync':
             from myqueue.syncronize import sync
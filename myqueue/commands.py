@@ -6,7 +6,7 @@ PythonFunction.  Use the factory function command() to create
 command objects.
 """
 from __future__ import annotations
-from typing import Any, Type, Callable
+from typing import Any, Type, Callable, Sequence
 from pathlib import Path
 from shlex import quote
 
@@ -15,18 +15,28 @@ from myqueue.resources import Resources
 
 class Command:
     """Base class."""
-    def __init__(self, name: str, args: list[str]):
+
+    __slots__ = ('args', 'name', 'custom_name', 'short_name', 'function')
+
+    def __init__(self, name: str, args: Sequence[str]):
         self.args = args
         if args:
             name += '+' + '_'.join(self.args)
         self.name = name
-        self.dct: dict[str, Any] = {'args': args}
+        self.custom_name = False
         self.short_name: str
         self.function: Callable[[], Any] | None = None
 
     def set_non_standard_name(self, name: str) -> None:
         self.name = name
-        self.dct['name'] = name
+        self.custom_name = True
+
+    @property
+    def dct(self) -> dict[str, Any]:
+        """Items common to all commands for todict()."""
+        if self.custom_name:
+            return {'args': list(self.args), 'name': self.name}
+        return {'args': list(self.args)}
 
     def todict(self) -> dict[str, Any]:
         raise NotImplementedError
@@ -90,7 +100,9 @@ def create_command(cmd: str,
 
 
 class ShellCommand(Command):
-    def __init__(self, cmd: str, args: list[str]):
+    __slots__ = ('cmd',)
+
+    def __init__(self, cmd: str, args: Sequence[str]):
         Command.__init__(self, cmd, args)
         self.cmd = cmd
         self.short_name = cmd
@@ -105,7 +117,9 @@ class ShellCommand(Command):
 
 
 class ShellScript(Command):
-    def __init__(self, cmd: str, args: list[str]):
+    __slots__ = ('cmd',)
+
+    def __init__(self, cmd: str, args: Sequence[str]):
         Command.__init__(self, Path(cmd).name, args)
         self.cmd = cmd
         self.short_name = cmd
@@ -126,7 +140,9 @@ class ShellScript(Command):
 
 
 class PythonScript(Command):
-    def __init__(self, script: str, args: list[str]):
+    __slots__ = ('script',)
+
+    def __init__(self, script: str, args: Sequence[str]):
         path = Path(script)
         Command.__init__(self, path.name, args)
         if '/' in script:
@@ -154,9 +170,11 @@ class PythonScript(Command):
 
 
 class WorkflowTask(Command):
+    __slots__ = ('script',)
+
     def __init__(self,
                  cmd: str,
-                 args: list[str],
+                 args: Sequence[str],
                  function: Callable[..., Any] = None):
         script, name = cmd.split(':')
         self.script = Path(script)
@@ -181,7 +199,9 @@ class WorkflowTask(Command):
 
 
 class PythonModule(Command):
-    def __init__(self, mod: str, args: list[str]):
+    __slots__ = ('mod',)
+
+    def __init__(self, mod: str, args: Sequence[str]):
         Command.__init__(self, mod, args)
         self.mod = mod
         self.short_name = mod
@@ -196,7 +216,9 @@ class PythonModule(Command):
 
 
 class PythonFunction(Command):
-    def __init__(self, cmd: str, args: list[str]):
+    __slots__ = ('mod', 'func')
+
+    def __init__(self, cmd: str, args: Sequence[str]):
         if ':' in cmd:
             # Backwards compatibility with version 4:
             self.mod, self.func = cmd.rsplit(':', 1)
@@ -217,7 +239,9 @@ class PythonFunction(Command):
 
 
 class PythonFunctionInScript(Command):
-    def __init__(self, cmd: str, args: list[str]):
+    __slots__ = ('script', 'func')
+
+    def __init__(self, cmd: str, args: Sequence[str]):
         script, self.func = cmd.rsplit('@', 1)
         path = Path(script)
         Command.__init__(self, path.name, args)
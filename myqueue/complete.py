@@ -12,23 +12,93 @@ import os
 import sys
 from typing import Iterable, Mapping, TYPE_CHECKING
 if TYPE_CHECKING:
-    from myqueue.task import Task
+    from pathlib import Path
 
 
-def read() -> list[Task]:
-    """Read queue as a dict."""
-    from pathlib import Path
-    from myqueue.config import Configuration
-    from myqueue.queue import Queue
-    from myqueue.selection import Selection
+def read() -> list[tuple[int, str]]:
+    """Read ids and names of tasks in current folder and subfolders.
 
-    config = Configuration.read()
-    with Queue(config, need_lock=False) as queue:
-        return queue.select(Selection(folders=[Path('.').resolve()]))
+    The SQLite file is read directly (no config.py file and no Task
+    objects) to make completion fast.  The result is cached in
+    ``.myqueue/completion.json`` until the SQLite file (or its
+    write-ahead log) changes.
+    """
+    import json
+    from pathlib import Path
+    from myqueue.config import find_home_folder
+    from myqueue.utils import normalize_folder
+
+    folder = Path.cwd().resolve()
+    try:
+        home = find_home_folder(folder)
+    except ValueError:
+        return []
+    path = home / '.myqueue/queue.sqlite3'
+    stamp = file_stamp(path)
+    if not stamp:
+        return []
+    stamp += file_stamp(path.with_name('queue.sqlite3-wal'))
+    f = normalize_folder(folder, home)
+
+    cachefile = home / '.myqueue/completion.json'
+    try:
+        cache = json.loads(cachefile.read_text())
+    except (OSError, ValueError):
+        cache = {}
+    if cache.get('stamp') != stamp:
+        cache = {'stamp': stamp, 'folders': {}}
+
+    folders = cache['folders']
+    rows = folders.get(f)
+    if rows is None:
+        rows = read_from_database(path, f)
+        folders[f] = rows
+        while len(folders) > MAX_CACHED_FOLDERS:
+            del folders[next(iter(folders))]
+        tmp = cachefile.with_name(f'completion.json.{os.getpid()}')
+        try:
+            tmp.write_text(json.dumps(cache))
+            tmp.replace(cachefile)
+        except OSError:
+            pass  # read-only file system?
+    return [(id, name) for id, name in rows]
+
+
+MAX_CACHED_FOLDERS = 100
+
+
+def file_stamp(path: Path) -> list[int]:
+    """Modification time and size (or [] if file doesn't exist)."""
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return []
+    return [st.st_mtime_ns, st.st_size]
+
+
+def read_from_database(path: Path, folder: str) -> list[tuple[int, str]]:
+    """Read ids and names of tasks in folder and its subfolders."""
+    import sqlite3
+    from myqueue.utils import folder_range
+    con = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        return con.execute(
+            'SELECT id, name FROM tasks_view '
+            'WHERE folder >= ? AND folder < ?',
+            folder_range(folder)).fetchall()
+    except sqlite3.OperationalError:
+        return []  # old file that hasn't been upgraded yet
+    finally:
+        con.close()
 
 
 # Beginning of computer generated data:
 commands = {
+    'archive':
+        ['-s', '--states', '-i', '--id', '-n', '--name', '-e', '--error',
+         '-z', '--dry-run', '-v', '--verbose', '-q', '--quiet',
+         '-T', '--traceback', '--older-than', '-r',
+         '--recursive'],
     'completion':
         ['-v', '--verbose', '-q', '--quiet', '-T', '--traceback'],
     'config':
@@ -51,13 +121,14 @@ commands = {
     'list':
         ['-s', '--states', '-i', '--id', '-n', '--name', '-e', '--error',
          '-c', '--columns', '-S', '--sort', '-C', '--count',
-         '--not-recursive', '-v', '--verbose', '-q', '--quiet',
-         '-T', '--traceback'],
+         '--limit', '--offset', '--not-recursive', '--archived',
+         '-v', '--verbose', '-q', '--quiet', '-T',
+         '--traceback'],
     'modify':
-        ['-E', '--email', '-N', '--new-state', '-s', '--states', '-i',
-         '--id', '-n', '--name', '-e', '--error', '-z',
-         '--dry-run', '-v', '--verbose', '-q', '--quiet', '-T',
-         '--traceback', '-r', '--recursive'],
+        ['-E', '--email', '-N', '--new-state', '-D', '--database-only',
+         '-s', '--states', '-i', '--id', '-n', '--name', '-e',
+         '--error', '-z', '--dry-run', '-v', '--verbose', '-q',
+         '--quiet', '-T', '--traceback', '-r', '--recursive'],
     'remove':
         ['-f', '--force', '-s', '--states', '-i', '--id', '-n', '--name',
          '-e', '--error', '-z', '--dry-run', '-v', '--verbose',
@@ -65,23 +136,24 @@ commands = {
          '--recursive'],
     'resubmit':
         ['--keep', '-R', '--resources', '-w', '--workflow', '-X',
-         '--extra-scheduler-args', '-s', '--states', '-i',
-         '--id', '-n', '--name', '-e', '--error', '-z',
-         '--dry-run', '-v', '--verbose', '-q', '--quiet', '-T',
-         '--traceback', '-r', '--recursive'],
+         '--extra-scheduler-args', '-S', '--script_commands',
+         '-s', '--states', '-i', '--id', '-n', '--name', '-e',
+         '--error', '-z', '--dry-run', '-v', '--verbose', '-q',
+         '--quiet', '-T', '--traceback', '-r', '--recursive'],
     'submit':
         ['-d', '--dependencies', '-n', '--name', '--restart',
          '--max-tasks', '-R', '--resources', '-w', '--workflow',
-         '-X', '--extra-scheduler-args', '-z', '--dry-run', '-v',
+         '-X', '--extra-scheduler-args', '-S',
+         '--script_commands', '-z', '--dry-run', '-v',
          '--verbose', '-q', '--quiet', '-T', '--traceback'],
     'sync':
         ['-z', '--dry-run', '-v', '--verbose', '-q', '--quiet', '-T',
          '--traceback'],
     'workflow':
         ['--max-tasks', '-f', '--force', '-t', '--targets', '-p',
-         '--pattern', '-a', '--arguments', '-z', '--dry-run',
-         '-v', '--verbose', '-q', '--quiet', '-T',
-         '--traceback']}
+         '--pattern', '-a', '--arguments', '-j', '--jobs',
+         '--incremental', '-z', '--dry-run', '-v', '--verbose',
+         '-q', '--quiet', '-T', '--traceback']}
 # End of computer generated data
 
 aliases = {'rm': 'remove',
@@ -104,13 +176,10 @@ def complete(word: str, previous: str, line: str, point: int) -> Iterable[str]:
         return commands[command]
 
     if previous in ['-n', '--name']:
-        tasks = read()
-        words = [task.cmd.name for task in tasks]
-        return words
+        return [name for id, name in read()]
 
     if previous in ['-i', '--id']:
-        tasks = read()
-        return {str(task.id) for task in tasks}
+        return {str(id) for id, name in read()}
 
     if command == 'help':
         return [cmd for cmd in (list(commands) + list(aliases))
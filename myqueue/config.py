@@ -2,7 +2,6 @@
 from __future__ import annotations
 
 import os
-import subprocess
 import warnings
 from math import inf
 from pathlib import Path
@@ -21,6 +20,11 @@ class Configuration:
                  maximum_total_task_weight: float = inf,
                  default_task_weight: float = 0.0,
                  notifications: dict[str, str] = None,
+                 submission_workers: int = 1,
+                 storage_profile: str | dict[str, str | int] = 'default',
+                 event_log: bool = False,
+                 workflow_cache: bool = False,
+                 archive_policy: dict[str, str] = None,
                  home: Path = None):
         """Configuration object.
 
@@ -34,6 +38,11 @@ class Configuration:
         self.maximum_total_task_weight = maximum_total_task_weight
         self.default_task_weight = default_task_weight
         self.notifications = notifications or {}
+        self.submission_workers = submission_workers
+        self.storage_profile = storage_profile
+        self.event_log = event_log
+        self.workflow_cache = workflow_cache
+        self.archive_policy = archive_policy or {}
         self.home = home or Path.cwd()
         self.user = os.environ.get('USER', 'root')
 
@@ -43,6 +52,12 @@ class Configuration:
                     '"features" and "reservation" have been deprecated.  '
                     'Please use "extra_args" instead.')
 
+        for states in self.archive_policy:
+            if not states or set(states) - set('dFCTMA'):
+                raise ValueError(
+                    f'Bad states in archive_policy: {states!r}.  '
+                    'Only finished tasks (dFCTMA) can be archived.')
+
     def __repr__(self) -> str:
         args = ', '.join(f'{name.lstrip("_")}={getattr(self, name)!r}'
                          for name in self.__dict__)
@@ -111,6 +126,7 @@ def find_home_folder(start: Path) -> Path:
 
 def guess_scheduler() -> str:
     """Try different scheduler commands to guess the correct scheduler."""
+    import subprocess
     scheduler_commands = {'sbatch': 'slurm',
                           'bsub': 'lsf',
                           'qsub': 'pbs'}
@@ -16,9 +16,7 @@ from pathlib import Path
 from time import sleep, time
 from typing import Any
 
-from myqueue.queue import Queue
 from myqueue.config import Configuration
-from myqueue.kick import kick
 
 T = 600  # kick system every ten minutes
 
@@ -77,6 +75,8 @@ def read_hostname_and_pid(pidfile: Path) -> tuple[str, int]:
 
 def loop(config: Configuration) -> None:
     """Main loop: kick system every ten minutes."""
+    from myqueue.kick import kick
+    from myqueue.queue import Queue
     err = config.home / f'.myqueue/daemon-{config.user}.err'
     out = config.home / f'.myqueue/daemon-{config.user}.out'
     pidfile = config.home / f'.myqueue/daemon-{config.user}.pid'
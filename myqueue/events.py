@@ -0,0 +1,160 @@
+"""Append-only event logs for state changes of running tasks.
+
+Running tasks append fixed-size records to a
+``.myqueue/events/<user>@<host>.<date>.log`` file (one file per user,
+node and day)::
+
+    <id:20> <state:1> <time:20> <host:32> <maxrss:16>
+
+States are 0 (running), 1 (done), 2 (FAILED), 3 (TIMEOUT) and 4
+(CANCELED) like for the ``<scheduler>-<id>-<state>`` files.  The queue
+remembers how far it has read each file, so only new records are parsed.
+"""
+from __future__ import annotations
+
+import os
+import socket
+import time
+import warnings
+from pathlib import Path
+
+RECORD_SIZE = 94
+
+# Keep consumed logs for this many days:
+KEEP = 2
+
+
+def record(id: int,
+           state: int,
+           t: float,
+           host: str,
+           maxrss: int = 0) -> bytes:
+    """Create event record.
+
+    >>> record(42, 1, 1.5, 'node7')[:30]
+    b'42                   1 1.50000'
+    >>> len(record(42, 1, 1.5, 'node7'))
+    94
+    """
+    line = f'{id:<20} {state} {t:<20.6f} {host[:32]:<32} {maxrss:<16}\n'
+    return line.encode()
+
+
+def log_name(user: str, host: str, t: float) -> str:
+    """Name of log file.
+
+    >>> log_name('jensj', 'node7', 0.0)
+    'jensj@node7.1970-01-01.log'
+    """
+    day = time.strftime('%Y-%m-%d', time.gmtime(t))
+    return f'{user}@{host}.{day}.log'
+
+
+def write_event(folder: Path,
+                id: int,
+                state: int,
+                maxrss: int = 0) -> None:
+    """Append event to log file in folder."""
+    host = socket.gethostname()
+    user = os.environ.get('USER', 'root')
+    t = time.time()
+    folder.mkdir(exist_ok=True)
+    fd = os.open(folder / log_name(user, host, t),
+                 os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+    try:
+        os.write(fd, record(id, state, t, host, maxrss))
+    finally:
+        os.close(fd)
+
+
+def shell_function(folder: Path) -> str:
+    """Bash function for reporting state changes: ``mqstate <state>``.
+
+    Writes the same records as :func:`write_event`.
+    """
+    return (
+        'mqstate() {\n'
+        f'  mkdir -p {folder} && \\\n'
+        "  printf '%-20s %s %-20.20s %-32.32s %-16s\\n' \\\n"
+        '    "$MYQUEUE_TASK_ID" $1 "$(date +%s.%N)" "$(hostname)" 0 \\\n'
+        f'    >> {folder}/${{USER:-root}}@$(hostname).$(date -u +%F).log\n'
+        '}\n')
+
+
+def read_events(folder: Path,
+                user: str,
+                offsets: dict[str, int]) -> list[tuple[float, int, int]]:
+    """Read new (time, id, state) events from a user's log files.
+
+    The *offsets* dictionary maps file names to the number of bytes
+    already read and will be updated.  Incomplete records at the end of a
+    file are left for next time.  Bad records (a task that was killed
+    while writing, a full disk, ...) are skipped with a warning.
+    """
+    events = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            name = entry.name
+            if not name.startswith(f'{user}@') or not name.endswith('.log'):
+                continue
+            offset = offsets.get(name, 0)
+            size = entry.stat().st_size
+            if size < offset:
+                offset = 0  # file was recreated
+            if size - offset < RECORD_SIZE:
+                continue
+            with open(entry.path, 'rb') as fd:
+                fd.seek(offset)
+                data = fd.read(size - offset)
+            # Records end with a newline, so we can find the next good
+            # record after a bad one:
+            end = data.rfind(b'\n') + 1
+            for line in data[:end].splitlines():
+                try:
+                    events.append(parse_record(line))
+                except ValueError:
+                    warnings.warn(f'Skipping bad record in {entry.path}: '
+                                  f'{line!r}')
+            offsets[name] = offset + end
+    return events
+
+
+def parse_record(line: bytes) -> tuple[float, int, int]:
+    """Get (time, id, state) from record (without the newline).
+
+    >>> parse_record(record(42, 1, 1.5, 'node7')[:-1])
+    (1.5, 42, 1)
+    >>> parse_record(b'42 1')
+    Traceback (most recent call last):
+      ...
+    ValueError: Bad record length: 4
+    """
+    if len(line) != RECORD_SIZE - 1:
+        raise ValueError(f'Bad record length: {len(line)}')
+    id, state, t, *_ = line.split()
+    if state not in {b'0', b'1', b'2', b'3', b'4'}:
+        raise ValueError(f'Bad state: {state!r}')
+    return float(t), int(id), int(state)
+
+
+def remove_old_logs(folder: Path,
+                    offsets: dict[str, int]) -> list[str]:
+    """Remove fully read log files that are more than KEEP days old.
+
+    Returns names of removed files.
+    """
+    oldest = time.strftime('%Y-%m-%d',
+                           time.gmtime(time.time() - KEEP * 24 * 3600))
+    removed = []
+    for name, offset in offsets.items():
+        day = name.rsplit('.', 2)[1]
+        if day < oldest:
+            path = folder / name
+            try:
+                size = path.stat().st_size
+            except FileNotFoundError:
+                size = offset
+            if size == offset:
+                path.unlink(missing_ok=True)
+                removed.append(name)
+    return removed
@@ -1,4 +1,7 @@
 from __future__ import annotations
+
+import json
+
 from myqueue.states import State
 from myqueue.email import send_notification
 from myqueue.pretty import pprint
@@ -6,6 +9,7 @@ from myqueue.utils import plural
 from myqueue.queue import Queue
 from myqueue.submitting import submit
 from myqueue.hold import hold_or_release
+from myqueue.archive import archive_old_tasks
 
 
 def kick(queue: Queue, verbosity: int = 1) -> dict[str, int]:
@@ -15,6 +19,7 @@ def kick(queue: Queue, verbosity: int = 1) -> dict[str, int]:
     * restart timed-out tasks
     * restart out-of-memory tasks
     * release/hold tasks to stay under *maximum_total_task_weight*
+    * archive old finished tasks (see *archive_policy*)
     """
     result = {}
 
@@ -35,8 +40,8 @@ def kick(queue: Queue, verbosity: int = 1) -> dict[str, int]:
         ids = list(queue.find_dependents(task.id for task in tasks))
 
         queue.cancel_dependents(ids)
-        for id in ids:
-            tasks.append(queue.tasks('id = ?', [id])[0])
+        tasks += queue.tasks('id IN (SELECT value FROM json_each(?))',
+                             [json.dumps(ids)])
 
         old_ids = [task.id for task in tasks]
 
@@ -54,5 +59,6 @@ def kick(queue: Queue, verbosity: int = 1) -> dict[str, int]:
         result['restarts'] = len(tasks)
 
     result.update(hold_or_release(queue))
+    result.update(archive_old_tasks(queue))
 
     return result
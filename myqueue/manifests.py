@@ -0,0 +1,157 @@
+"""Manifests for incremental workflows.
+
+For each (folder, script) pair, a manifest remembers the inputs seen the
+last time tasks were collected::
+
+    {"script": <sha256 of script>,
+     "kwargs": <repr of kwargs>,
+     "mtime": <mtime of folder in ns>,
+     "files": {<pattern>: [[<file>, <mtime in ns>], ...], ...},
+     "tasks": [[<folder>, <name>, <id>, <state>], ...]}
+
+File patterns (from the *creates* lists, which includes ``*.result``
+files) and folders are relative to the root of the queue.  If nothing
+has changed since then, the workflow function would return the same
+tasks and there would be nothing new to submit, so the folder can be
+skipped.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Iterable
+
+from myqueue.queue import Queue
+from myqueue.task import Task
+from myqueue.utils import normalize_folder
+
+
+class Manifests:
+    """Find unchanged folders and record manifests for collected ones.
+
+    With *force* (failed tasks will be resubmitted), no folders are
+    skipped.
+    """
+    def __init__(self,
+                 queue: Queue,
+                 kwargs: dict[str, Any],
+                 force: bool = False):
+        self.queue = queue
+        self.force = force
+        self.root = queue.config.home
+        self.kwargs = repr(kwargs)
+        self.hashes: dict[Path, str] = {}
+        self.collected: list[tuple[Path, Path, list[Task]]] = []
+
+    def key(self, script: Path, folder: Path) -> tuple[str, str]:
+        """Key for manifests table."""
+        return (normalize_folder(folder.absolute(), self.root),
+                str(script.absolute()))
+
+    def script_hash(self, script: Path) -> str:
+        """Hash of script content."""
+        h = self.hashes.get(script)
+        if h is None:
+            h = hashlib.sha256(script.read_bytes()).hexdigest()
+            self.hashes[script] = h
+        return h
+
+    def file_stamps(self, patterns: list[str]) -> dict[str, list[Any]]:
+        """Find (file, mtime) pairs for files matching patterns."""
+        return {pattern: [[str(path.relative_to(self.root)),
+                           path.stat().st_mtime_ns]
+                          for path in sorted(self.root.glob(pattern))]
+                for pattern in patterns}
+
+    def manifest(self,
+                 script: Path,
+                 folder: Path,
+                 patterns: list[str],
+                 tasks: list[list[Any]]) -> dict[str, Any]:
+        """Create manifest for current state of folder."""
+        return {'script': self.script_hash(script),
+                'kwargs': self.kwargs,
+                'mtime': folder.stat().st_mtime_ns,
+                'files': self.file_stamps(patterns),
+                'tasks': tasks}
+
+    def find_ids_and_states(self, keys: Iterable[tuple[str, str]]
+                            ) -> dict[tuple[str, str], tuple[int, str]]:
+        """Find tasks in the queue or done tasks in the archive.
+
+        Same rule as prune() uses.
+        """
+        keys = list(keys)
+        found = self.queue.find_ids_and_states(keys)
+        archived = self.queue.find_ids_and_states(
+            (key for key in keys if key not in found), archived=True)
+        for key, (id, state) in archived.items():
+            if state == 'd':
+                found[key] = (id, state)
+        return found
+
+    def unchanged(self, scripts_and_folders: list[tuple[Path, Path]]
+                  ) -> list[bool]:
+        """Check which (script, folder) pairs are unchanged."""
+        if self.force:
+            return [False] * len(scripts_and_folders)
+        keys = [self.key(script, folder)
+                for script, folder in scripts_and_folders]
+        manifests = {key: json.loads(data)
+                     for key, data in self.queue.get_manifests(keys).items()}
+        found = self.find_ids_and_states(
+            (f, name)
+            for manifest in manifests.values()
+            for f, name, id, state in manifest['tasks'])
+
+        result = []
+        for (script, folder), key in zip(scripts_and_folders, keys):
+            old = manifests.get(key)
+            if old is None:
+                result.append(False)
+                continue
+            tasks = [[f, name, *found.get((f, name), (-1, ''))]
+                     for f, name, id, state in old['tasks']]
+            new = self.manifest(script, folder, list(old['files']), tasks)
+            result.append(new == old)
+        return result
+
+    def add(self, script: Path, folder: Path, tasks: list[Task]) -> None:
+        """Remember tasks collected from folder."""
+        self.collected.append((script, folder, tasks))
+
+    def save(self) -> None:
+        """Write manifests for collected folders.
+
+        Must be called after the tasks have been submitted.  Folders with
+        tasks that are neither in the queue nor done are not complete
+        (dry-run, targets, ...) and will not get a manifest.
+        """
+        found = self.find_ids_and_states(
+            (normalize_folder(task.folder, self.root), task.cmd.name)
+            for script, folder, tasks in self.collected
+            for task in tasks)
+
+        manifests: dict[tuple[str, str], str | None] = {}
+        for script, folder, tasks in self.collected:
+            rows = []
+            complete = True
+            for task in tasks:
+                f = normalize_folder(task.folder, self.root)
+                id, state = found.get((f, task.cmd.name), (-1, ''))
+                if id == -1 and not task.check_creates_files():
+                    complete = False
+                    break
+                rows.append([f, task.cmd.name, id, state])
+            key = self.key(script, folder)
+            if not complete:
+                manifests[key] = None
+                continue
+            patterns = [str((task.folder / pattern).relative_to(self.root))
+                        for task in tasks
+                        for pattern in task.creates]
+            manifest = self.manifest(script, folder, patterns, rows)
+            manifests[key] = json.dumps(manifest)
+
+        self.queue.set_manifests(manifests)
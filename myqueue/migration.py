@@ -2,6 +2,7 @@ import json
 from pathlib import Path
 from sqlite3 import Connection
 
+from myqueue.queue import insert_tasks
 from myqueue.task import Task
 
 
@@ -32,10 +33,7 @@ def migrate(jsonfile: Path, con: Connection) -> None:
             deps.append((task.id, ids[dep]))
 
     with con:
-        q = ', '.join('?' * 18)
-        con.executemany(
-            f'INSERT INTO tasks VALUES ({q})',
-            [task.to_sql(root) for task in tasks])
+        insert_tasks(con, [task.to_sql(root) for task in tasks])
         con.executemany(
             'INSERT INTO dependencies VALUES (?, ?)', deps)
 
@@ -1,12 +1,17 @@
 from __future__ import annotations
 import os
 import sys
-from collections import defaultdict
+from collections import defaultdict, deque
+from itertools import chain, islice
 from pathlib import Path
+from typing import Iterable, Iterator
 
-from myqueue.task import Task
+from myqueue.task import LIST_COLUMNS, SORT_COLUMNS, Task
 from myqueue.utils import mqhome
 
+TITLES = {'i': 'id', 'f': 'folder', 'n': 'name', 'a': 'args', 'I': 'info',
+          'r': 'res.', 'A': 'age', 's': 'state', 't': 'time', 'e': 'error'}
+
 
 def colored(state: str) -> str:
     """Yellow for running, red for bad, green for done."""
@@ -45,13 +50,7 @@ def pprint(tasks: list[Task],
     home = str(mqhome()) + '/'
     cwd = str(Path.cwd()) + '/'
 
-    if columns.endswith('-'):
-        columns = ''.join(c for c in 'ifnaIrAste' if c not in columns[:-1])
-
-    titles = ['id', 'folder', 'name', 'args', 'info',
-              'res.', 'age', 'state', 'time', 'error']
-    c2i = {c: i for i, c in enumerate('ifnaIrAste')}
-    indices = [c2i[c] for c in columns]
+    columns = expand_columns(columns)
 
     if len(tasks) > maxlines:
         cut1 = maxlines // 2
@@ -64,16 +63,14 @@ def pprint(tasks: list[Task],
     lines = []
     lengths = [0] * len(columns)
 
+    f = columns.find('f')
+
     count: dict[str, int] = defaultdict(int)
     for task in tasks:
-        words = task.words()
-        _, folder, _, _, _, _, _, state, _, _ = words
-        count[state] += 1
-        if folder.startswith(cwd):
-            words[1] = './' + folder[len(cwd):]
-        elif folder.startswith(home):
-            words[1] = '~/' + folder[len(home):]
-        words = [words[i] for i in indices]
+        count[task.state.name] += 1
+        words = task.words(columns)
+        if f >= 0:
+            words[f] = shorten_folder(words[f], cwd, home)
         lines.append(words)
         lengths = [max(n, len(word)) for n, word in zip(lengths, words)]
 
@@ -87,7 +84,7 @@ def pprint(tasks: list[Task],
         lines[cut1:cut1] = [[f'... ({skipped} tasks not shown)']]
 
     if verbosity:
-        lines[:0] = [[titles[c2i[c]] for c in columns]]
+        lines[:0] = [[TITLES[c] for c in columns]]
         lengths = [max(length, len(title))
                    for length, title in zip(lengths, lines[0])]
 
@@ -108,16 +105,7 @@ def pprint(tasks: list[Task],
 
     if not short:
         for i, words in enumerate(lines):
-            words2 = []
-            for word, c, L in zip(words, columns, lengths):
-                if c in 'At':
-                    word = word.rjust(L)
-                else:
-                    word = word.ljust(L)
-                    if c == 's' and use_color:
-                        word = colored(word)
-                words2.append(word)
-            line = ' '.join(words2)
+            line = format_line(words, columns, lengths, use_color)
             if use_color:
                 if i == 0:
                     line = '\033[94m' + line + '\033[0m'
@@ -127,8 +115,180 @@ def pprint(tasks: list[Task],
 
     if verbosity:
         count['total'] = len(tasks)
-        print(', '.join(f'{colored(state) if use_color else state}: {n}'
-                        for state, n in count.items()))
+        print_count(count, use_color)
+
+
+def pprint_stream(tasks: Iterable[Task],
+                  *,
+                  verbosity: int = 1,
+                  columns: str = 'ifnaIrAste',
+                  maxlines: int = 9999999999,
+                  sample: int = 1000) -> None:
+    """Pretty-print tasks while they are read.
+
+    Column widths and which columns are empty (and left out like in
+    :func:`pprint`) are found from the first *sample* tasks (longer texts
+    will be cut, except ids, times and states) and only *maxlines* lines
+    are kept in memory.  Fewer tasks than that are printed with
+    :func:`pprint`.
+    """
+    if verbosity < 0:
+        return
+
+    iterator = iter(tasks)
+    first = list(islice(iterator, sample))
+    if len(first) < sample:
+        pprint(first, verbosity=verbosity, columns=columns, maxlines=maxlines)
+        return
+
+    home = str(mqhome()) + '/'
+    cwd = str(Path.cwd()) + '/'
+    columns = expand_columns(columns)
+    f = columns.find('f')
+
+    count: dict[str, int] = defaultdict(int)
+
+    def rows(tasks: Iterable[Task]) -> Iterator[list[str]]:
+        for task in tasks:
+            count[task.state.name] += 1
+            words = task.words(columns)
+            if f >= 0:
+                words[f] = shorten_folder(words[f], cwd, home)
+            yield words
+
+    lines = list(rows(first))
+
+    # Remove columns that are empty in the sample (rows() will use the
+    # new columns for the rest of the tasks):
+    keep = [i for i in range(len(columns))
+            if any(words[i] for words in lines)]
+    lines = [[words[i] for i in keep] for words in lines]
+    columns = ''.join(columns[i] for i in keep)
+    f = columns.find('f')
+
+    # Columns are at least as wide as their titles (also without header)
+    # so that later rows are not cut too much:
+    titles = [TITLES[c] for c in columns]
+    lengths = [max(len(title), max(len(words[i]) for words in lines))
+               for i, title in enumerate(titles)]
+    header = [titles] if verbosity else []
+
+    try:
+        N = os.get_terminal_size().columns - 1
+    except OSError:
+        pass
+    else:
+        fit_to_termial_size(N, header + lines, lengths)
+
+    use_color = sys.stdout.isatty() and 'MYQUEUE_TESTING' not in os.environ
+
+    def write(words: list[str], highlight: bool = False) -> None:
+        # Numbers, times and states are never cut:
+        words = [word if c in 'iAst' else cut(word, L)
+                 for word, c, L in zip(words, columns, lengths)]
+        line = format_line(words, columns, lengths, use_color)
+        if use_color and (highlight or not verbosity):
+            line = '\033[93m' + line + '\033[0m'
+        print(line)
+
+    rule = ['─' * L for L in lengths]
+    if verbosity:
+        line = format_line(header[0], columns, lengths, False)
+        if use_color:
+            line = '\033[94m' + line + '\033[0m'
+        print(line)
+        write(rule, highlight=True)
+
+    # Print the first half right away and keep the rest in a buffer:
+    cut1 = maxlines // 2
+    n = 0
+    buffer: deque[list[str]] = deque(maxlen=maxlines - cut1)
+    for words in chain(lines, rows(iterator)):
+        if n < cut1:
+            write(words)
+        else:
+            buffer.append(words)
+        n += 1
+
+    if n > maxlines:
+        cut2 = maxlines - cut1 - 2
+        print(f'... ({n - cut1 - cut2} tasks not shown)')
+        for words in list(buffer)[len(buffer) - cut2:]:
+            write(words)
+    else:
+        for words in buffer:
+            write(words)
+
+    if verbosity:
+        write(rule, highlight=True)
+        count['total'] = n
+        print_count(count, use_color)
+
+
+def shorten_folder(folder: str, cwd: str, home: str) -> str:
+    """Make folder relative to current folder or home folder.
+
+    >>> shorten_folder('/home/x/a/', '/home/x/', '/home/')
+    './a/'
+    >>> shorten_folder('/home/y/a/', '/home/x/', '/home/')
+    '~/y/a/'
+    """
+    if folder.startswith(cwd):
+        return './' + folder[len(cwd):]
+    if folder.startswith(home):
+        return '~/' + folder[len(home):]
+    return folder
+
+
+def format_line(words: list[str],
+                columns: str,
+                lengths: list[int],
+                use_color: bool) -> str:
+    """Pad words to given lengths and join them."""
+    words2 = []
+    for word, c, L in zip(words, columns, lengths):
+        if c in 'At':
+            word = word.rjust(L)
+        else:
+            word = word.ljust(L)
+            if c == 's' and use_color:
+                word = colored(word)
+        words2.append(word)
+    return ' '.join(words2)
+
+
+def print_count(count: dict[str, int], use_color: bool = None) -> None:
+    """Print number of tasks for each state."""
+    if use_color is None:
+        use_color = (sys.stdout.isatty() and
+                     'MYQUEUE_TESTING' not in os.environ)
+    print(', '.join(f'{colored(state) if use_color else state}: {n}'
+                    for state, n in count.items()))
+
+
+def expand_columns(columns: str) -> str:
+    """Expand "c-" to all columns except c.
+
+    >>> expand_columns('a-')
+    'ifnIrAste'
+    """
+    if columns.endswith('-'):
+        columns = ''.join(c for c in 'ifnaIrAste' if c not in columns[:-1])
+    return columns
+
+
+def sql_columns(columns: str, sort: str | None = None) -> list[str]:
+    """Columns of the tasks table needed for pprint().
+
+    >>> sql_columns('is', sort='a')
+    ['state', 'id', 'tqueued']
+    """
+    names = ['state']
+    for c in expand_columns(columns):
+        names += LIST_COLUMNS[c]
+    if sort is not None:
+        names += SORT_COLUMNS.get(sort, [])
+    return list(dict.fromkeys(names))
 
 
 def fit_to_termial_size(N: int,
@@ -162,7 +322,11 @@ def cut(word: str, L: int) -> str:
 
     >>> cut('123456789', 5)
     '12…89'
+    >>> cut('abcdef', 2)
+    'ab'
     """
+    if L <= 2:
+        return word[:L]
     if len(word) > L:
         l1 = L // 2
         l2 = L - l1 - 1
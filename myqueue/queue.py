@@ -8,37 +8,49 @@ File format versions:
 9)  Added "user".
 10) Switched to sqlite3.
 11) Renamed diskspace to weight.
+12) New indices for (folder, name), (user, state) and (state, restart).
+13) New manifests table for incremental workflows.
+14) Resources stored in cores, processes, tmax and nodename columns.
+15) Folders and commands stored in separate tables.  Read tasks from
+    the tasks_view view.
+16) New archive table (and archive_view) for finished tasks.
 """
 from __future__ import annotations
 
+import json
+import os
 import sqlite3
 import sys
 import time
 from functools import cached_property
 from pathlib import Path
 from types import TracebackType
-from typing import Iterable, Iterator, Sequence
-
-from typing_extensions import LiteralString
+from typing import TYPE_CHECKING, Iterable, Iterator, Sequence
 
 from myqueue.config import Configuration
-from myqueue.migration import migrate
+from myqueue.events import read_events, remove_old_logs
 from myqueue.schedulers import Scheduler, get_scheduler
 from myqueue.selection import Selection
 from myqueue.states import State
-from myqueue.task import Task, create_task
+from myqueue.task import LazyTask, Task, create_task
 from myqueue.utils import Lock, normalize_folder, plural
 
-VERSION = 11
+if TYPE_CHECKING:
+    from typing_extensions import LiteralString
+
+VERSION = 16
 
 INIT = """\
 CREATE TABLE tasks (
     id INTEGER PRIMARY KEY,
-    folder TEXT,
+    fid INTEGER,
     state CHARCTER,
     name TEXT,
-    cmd TEXT,
-    resources TEXT,
+    cid INTEGER,
+    cores INTEGER,
+    processes INTEGER,
+    tmax INTEGER,
+    nodename TEXT,
     restart INTEGER,
     workflow INTEGER,
     deps TEXT,
@@ -51,6 +63,12 @@ CREATE TABLE tasks (
     error TEXT,
     user TEXT,
     script_commands TEXT);
+CREATE TABLE folders (
+    id INTEGER PRIMARY KEY,
+    folder TEXT UNIQUE);
+CREATE TABLE commands (
+    id INTEGER PRIMARY KEY,
+    cmd TEXT UNIQUE);
 CREATE TABLE dependencies (
     id INTEGER,
     did INTEGER,
@@ -59,17 +77,257 @@ CREATE TABLE dependencies (
 CREATE TABLE meta (
     key TEXT,
     value TEXT);
-CREATE INDEX folder_index on tasks(folder);
+CREATE INDEX folder_name_index on tasks(fid, name, id, state);
 CREATE INDEX state_index on tasks(state);
+CREATE INDEX user_state_index on tasks(user, state);
+CREATE INDEX state_restart_index on tasks(state, restart);
 CREATE INDEX dependincies_index1 on dependencies(id);
-CREATE INDEX dependincies_index2 on dependencies(did)
+CREATE INDEX dependincies_index2 on dependencies(did);
+CREATE TABLE manifests (
+    folder TEXT,
+    script TEXT,
+    data TEXT,
+    PRIMARY KEY (folder, script));
+CREATE VIEW tasks_view AS SELECT
+    tasks.id AS id, folder, state, name, cmd,
+    cores, processes, tmax, nodename, restart, workflow, deps, weight,
+    notifications, creates, tqueued, trunning, tstop, error, user,
+    script_commands
+    FROM tasks
+    JOIN folders ON folders.id = fid
+    JOIN commands ON commands.id = cid;
+CREATE TABLE archive (
+    id INTEGER PRIMARY KEY,
+    fid INTEGER,
+    state CHARCTER,
+    name TEXT,
+    cid INTEGER,
+    cores INTEGER,
+    processes INTEGER,
+    tmax INTEGER,
+    nodename TEXT,
+    restart INTEGER,
+    workflow INTEGER,
+    deps TEXT,
+    weight REAL,
+    notifications TEXT,
+    creates TEXT,
+    tqueued REAL,
+    trunning REAL,
+    tstop REAL,
+    error TEXT,
+    user TEXT,
+    script_commands TEXT);
+CREATE INDEX archive_folder_name_index on archive(fid, name, id, state);
+CREATE VIEW archive_view AS SELECT
+    archive.id AS id, folder, state, name, cmd,
+    cores, processes, tmax, nodename, restart, workflow, deps, weight,
+    notifications, creates, tqueued, trunning, tstop, error, user,
+    script_commands
+    FROM archive
+    JOIN folders ON folders.id = fid
+    JOIN commands ON commands.id = cid
 """
 
+# Statements for upgrading from version n to n + 1:
+UPGRADES = {
+    11: """\
+DROP INDEX folder_index;
+CREATE INDEX folder_name_index on tasks(folder, name, id, state);
+CREATE INDEX user_state_index on tasks(user, state);
+CREATE INDEX state_restart_index on tasks(state, restart)
+""",
+    12: """\
+CREATE TABLE manifests (
+    folder TEXT,
+    script TEXT,
+    data TEXT,
+    PRIMARY KEY (folder, script))
+""",
+    13: """\
+CREATE TABLE new_tasks (
+    id INTEGER PRIMARY KEY,
+    folder TEXT,
+    state CHARCTER,
+    name TEXT,
+    cmd TEXT,
+    cores INTEGER,
+    processes INTEGER,
+    tmax INTEGER,
+    nodename TEXT,
+    restart INTEGER,
+    workflow INTEGER,
+    deps TEXT,
+    weight REAL,
+    notifications TEXT,
+    creates TEXT,
+    tqueued REAL,
+    trunning REAL,
+    tstop REAL,
+    error TEXT,
+    user TEXT,
+    script_commands TEXT);
+INSERT INTO new_tasks SELECT
+    id, folder, state, name, cmd,
+    json_extract(resources, '$.cores'),
+    COALESCE(json_extract(resources, '$.processes'),
+             json_extract(resources, '$.cores')),
+    COALESCE(json_extract(resources, '$.tmax'), 600),
+    COALESCE(json_extract(resources, '$.nodename'), ''),
+    restart, workflow, deps, weight, notifications, creates,
+    tqueued, trunning, tstop, error, user, script_commands
+    FROM tasks;
+DROP TABLE tasks;
+ALTER TABLE new_tasks RENAME TO tasks;
+CREATE INDEX folder_name_index on tasks(folder, name, id, state);
+CREATE INDEX state_index on tasks(state);
+CREATE INDEX user_state_index on tasks(user, state);
+CREATE INDEX state_restart_index on tasks(state, restart)
+""",
+    14: """\
+CREATE TABLE folders (
+    id INTEGER PRIMARY KEY,
+    folder TEXT UNIQUE);
+CREATE TABLE commands (
+    id INTEGER PRIMARY KEY,
+    cmd TEXT UNIQUE);
+INSERT INTO folders (folder) SELECT DISTINCT folder FROM tasks;
+INSERT INTO commands (cmd) SELECT DISTINCT cmd FROM tasks;
+CREATE TABLE new_tasks (
+    id INTEGER PRIMARY KEY,
+    fid INTEGER,
+    state CHARCTER,
+    name TEXT,
+    cid INTEGER,
+    cores INTEGER,
+    processes INTEGER,
+    tmax INTEGER,
+    nodename TEXT,
+    restart INTEGER,
+    workflow INTEGER,
+    deps TEXT,
+    weight REAL,
+    notifications TEXT,
+    creates TEXT,
+    tqueued REAL,
+    trunning REAL,
+    tstop REAL,
+    error TEXT,
+    user TEXT,
+    script_commands TEXT);
+INSERT INTO new_tasks SELECT
+    tasks.id, folders.id, state, name, commands.id,
+    cores, processes, tmax, nodename, restart, workflow, deps, weight,
+    notifications, creates, tqueued, trunning, tstop, error, user,
+    script_commands
+    FROM tasks
+    JOIN folders ON folders.folder = tasks.folder
+    JOIN commands ON commands.cmd = tasks.cmd;
+DROP TABLE tasks;
+ALTER TABLE new_tasks RENAME TO tasks;
+CREATE INDEX folder_name_index on tasks(fid, name, id, state);
+CREATE INDEX state_index on tasks(state);
+CREATE INDEX user_state_index on tasks(user, state);
+CREATE INDEX state_restart_index on tasks(state, restart);
+CREATE VIEW tasks_view AS SELECT
+    tasks.id AS id, folder, state, name, cmd,
+    cores, processes, tmax, nodename, restart, workflow, deps, weight,
+    notifications, creates, tqueued, trunning, tstop, error, user,
+    script_commands
+    FROM tasks
+    JOIN folders ON folders.id = fid
+    JOIN commands ON commands.id = cid
+""",
+    15: """\
+CREATE TABLE archive (
+    id INTEGER PRIMARY KEY,
+    fid INTEGER,
+    state CHARCTER,
+    name TEXT,
+    cid INTEGER,
+    cores INTEGER,
+    processes INTEGER,
+    tmax INTEGER,
+    nodename TEXT,
+    restart INTEGER,
+    workflow INTEGER,
+    deps TEXT,
+    weight REAL,
+    notifications TEXT,
+    creates TEXT,
+    tqueued REAL,
+    trunning REAL,
+    tstop REAL,
+    error TEXT,
+    user TEXT,
+    script_commands TEXT);
+CREATE INDEX archive_folder_name_index on archive(fid, name, id, state);
+CREATE VIEW archive_view AS SELECT
+    archive.id AS id, folder, state, name, cmd,
+    cores, processes, tmax, nodename, restart, workflow, deps, weight,
+    notifications, creates, tqueued, trunning, tstop, error, user,
+    script_commands
+    FROM archive
+    JOIN folders ON folders.id = fid
+    JOIN commands ON commands.id = cid
+"""}
+
+
+STORAGE_PROFILES: dict[str, dict[str, str | int]] = {
+    # SQLite's defaults:
+    'default': {},
+    # Local disk:
+    'local': {'journal_mode': 'WAL',
+              'synchronous': 'NORMAL',
+              'cache_size': -16000,
+              'mmap_size': 2**26,
+              'temp_store': 'MEMORY'},
+    # NFS, Lustre, ...  (no WAL and no memory mapping).  A rollback
+    # journal needs synchronous=FULL to be durable:
+    'network': {'journal_mode': 'TRUNCATE',
+                'synchronous': 'FULL',
+                'cache_size': -16000,
+                'mmap_size': 0,
+                'temp_store': 'MEMORY'}}
+
+PRAGMAS = {'journal_mode', 'synchronous', 'cache_size', 'mmap_size',
+           'temp_store'}
+
+
+def storage_pragmas(profile: str | dict[str, str | int]
+                    ) -> dict[str, str | int]:
+    """Get SQLite pragmas for a storage profile.
+
+    The profile can be the name of one of the predefined profiles or
+    a dict of pragmas.
+
+    >>> storage_pragmas('network')['journal_mode']
+    'TRUNCATE'
+    >>> storage_pragmas({'synchronous': 'OFF'})
+    {'synchronous': 'OFF'}
+    """
+    if isinstance(profile, str):
+        if profile not in STORAGE_PROFILES:
+            raise ValueError(f'Unknown storage profile: {profile!r}.  '
+                             'Must be one of ' +
+                             ', '.join(STORAGE_PROFILES))
+        return STORAGE_PROFILES[profile]
+    for key, value in profile.items():
+        if key not in PRAGMAS:
+            raise ValueError(f'Unknown pragma: {key!r}')
+        if not str(value).lstrip('-').isalnum():
+            raise ValueError(f'Bad value for {key}: {value!r}')
+    return profile
+
 
 class DependencyError(Exception):
     """Bad dependency."""
 
 
+class OldDatabaseError(Exception):
+    """Database file needs an upgrade that we can't do."""
+
+
 class Queue:
     """Object for interacting with your .myqueue/queue.sqlite3 file"""
     def __init__(self,
@@ -94,10 +352,12 @@ class Queue:
         if self.need_lock:
             self.lock.acquire()
         else:
+            # Don't wait for a writer.  It's OK to read without
+            # the lock (or without beeing able to write):
             try:
-                self.lock.acquire()
+                self.lock.acquire(blocking=False)
             except PermissionError:
-                pass  # it's OK to try to read without beeing able to write
+                pass
 
         return self
 
@@ -120,6 +380,12 @@ class Queue:
         else:
             self._connection = sqlite3.connect(f'file:{sqlfile}?mode=ro',
                                                uri=True)
+
+        pragmas = storage_pragmas(self.config.storage_profile)
+        for key, value in pragmas.items():
+            if key != 'journal_mode':
+                self._connection.execute(f'PRAGMA {key} = {value}')
+
         cur = self._connection.execute(
             'SELECT COUNT(*) FROM sqlite_master WHERE name="tasks"')
 
@@ -131,6 +397,21 @@ class Queue:
                     'SELECT value FROM meta where key="version"')
                 .fetchone()[0])
             assert 11 <= version <= VERSION
+            if version < VERSION:
+                if not self.lock.locked:
+                    # The views and columns we need don't exist yet:
+                    self._connection.close()
+                    self._connection = None
+                    raise OldDatabaseError(
+                        f'{sqlfile} has version {version} and must be '
+                        f'upgraded to version {VERSION}.  Run mq with '
+                        f'write access to {self.folder} and when no '
+                        'other mq command is running to upgrade it.')
+                self._upgrade_db(version)
+
+        if self.lock.locked and not self.dry_run:
+            self._set_journal_mode(
+                str(pragmas.get('journal_mode', 'DELETE')).upper())
 
         if self.lock.locked and not self.dry_run:
             self.process_change_files()
@@ -147,20 +428,20 @@ class Queue:
                 deps.append((task.id, dep.id))
 
         root = self.folder.parent
-        q = ', '.join('?' * 18)
         with self.connection as con:
-            con.executemany(
-                f'INSERT INTO tasks VALUES ({q})',
-                [task.to_sql(root) for task in tasks])
+            insert_tasks(con, [task.to_sql(root) for task in tasks])
             con.executemany('INSERT INTO dependencies VALUES (?, ?)', deps)
 
     def sql(self,
             statement: LiteralString,
-            args: list[str | int] = None) -> Iterator[tuple]:
+            args: Sequence[str | int | float] = None) -> Iterator[tuple]:
         """Raw SQL execution."""
         return self.connection.execute(statement, args or [])
 
-    def select(self, selection: Selection = None) -> list[Task]:
+    def select(self,
+               selection: Selection = None,
+               columns: Sequence[str] = None,
+               archived: bool = False) -> list[Task]:
         """Create tasks from selection object."""
         root = self.folder.parent
         if selection:
@@ -168,22 +449,73 @@ class Queue:
         else:
             where = ''
             args = []
-        return self.tasks(where, args)
+        return self.tasks(where, args, columns, archived)
 
     def tasks(self,
               where: LiteralString,
-              args: list[str | int] = None) -> list[Task]:
-        """Create tasks from SQL WHERE statement."""
+              args: Sequence[str | int | float] = None,
+              columns: Sequence[str] = None,
+              archived: bool = False) -> list[Task]:
+        """Create tasks from SQL WHERE statement.
+
+        If *columns* is given, only those columns are read and
+        :class:`~myqueue.task.LazyTask` objects are returned.
+        """
+        with self.connection:
+            return list(self.iter_tasks(where, args, columns,
+                                        archived=archived))
+
+    def iter_tasks(self,
+                   where: LiteralString,
+                   args: Sequence[str | int | float] = None,
+                   columns: Sequence[str] = None,
+                   order: LiteralString = '',
+                   limit: int = -1,
+                   offset: int = 0,
+                   archived: bool = False) -> Iterator[Task]:
+        """Yield tasks from SQL WHERE statement as they are read.
+
+        Use *order* for an ``ORDER BY`` clause (example: ``'id DESC'``)
+        and *limit* and *offset* to get only some of the tasks.  Use
+        *archived=True* to read tasks from the archive.
+        """
         root = self.folder.parent
+        what = '*' if columns is None else ', '.join(columns)
+        view = 'archive_view' if archived else 'tasks_view'
+        sql = f'SELECT {what} FROM {view}'
         if where:
-            sql = f'SELECT * FROM tasks WHERE {where}'
+            sql += f' WHERE {where}'
+        if order:
+            sql += f' ORDER BY {order}'
+        if limit >= 0 or offset:
+            sql += ' LIMIT ? OFFSET ?'
+            args = [*(args or []), limit, offset]
+        # Tasks in the same folder will share one Path object:
+        paths: dict[str, Path] = {}
+        if columns is None:
+            for row in self.sql(sql, args or []):
+                yield Task.from_sql_row(row, root, paths)
         else:
-            sql = 'SELECT * FROM tasks'
-        with self.connection:
-            tasks = []
             for row in self.sql(sql, args or []):
-                tasks.append(Task.from_sql_row(row, root))
-        return tasks
+                yield LazyTask(dict(zip(columns, row)), root, paths)
+
+    def count(self,
+              selection: Selection = None,
+              archived: bool = False) -> dict[str, int]:
+        """Count tasks in each state.
+
+        States are ordered by their first appearance (sorted by id).
+        """
+        root = self.folder.parent
+        view = 'archive_view' if archived else 'tasks_view'
+        sql = f'SELECT state, COUNT(*) FROM {view}'
+        args: list[str | int] = []
+        if selection:
+            where, args = selection.sql_where_statement(root)
+            if where:
+                sql += f' WHERE {where}'
+        sql += ' GROUP BY state ORDER BY MIN(id)'
+        return {State(state).name: n for state, n in self.sql(sql, args)}
 
     def _initialize_db(self) -> None:
         """Initialize tables and write version number."""
@@ -196,27 +528,122 @@ class Queue:
 
         jsonfile = self.folder / 'queue.json'
         if jsonfile.is_file():
+            from myqueue.migration import migrate
             migrate(jsonfile, self.connection)
 
-    def find_dependents(self,
-                        ids: Iterable[int],
-                        known: dict[int, list[int]] = None) -> Iterator[int]:
-        """Yield dependents."""
-        if known is None:
-            known = {}
-        result = set()
-        for id in ids:
-            if id in known:
-                result.update(known[id])
-            else:
-                dependents = [
-                    id for id, in self.sql(
-                        'SELECT id FROM dependencies WHERE did = ?', [id])]
-                known[id] = dependents
-                result.update(dependents)
-        if result:
-            yield from result
-            yield from self.find_dependents(result, known)
+    def _upgrade_db(self, version: int) -> None:
+        """Upgrade database to newest version."""
+        assert self.lock.locked
+        con = self.connection
+        while version < VERSION:
+            # The sqlite3 module doesn't open a transaction for DDL
+            # statements, so we do it ourselves.  Each step is committed
+            # together with its version number so that an interrupted
+            # upgrade can be continued:
+            with con:
+                con.execute('BEGIN')
+                for statement in UPGRADES[version].split(';'):
+                    con.execute(statement)
+                version += 1
+                con.execute(
+                    'UPDATE meta SET value = ? WHERE key = "version"',
+                    [str(version)])
+
+    def _set_journal_mode(self, mode: str) -> None:
+        """Change journal mode and write it to the meta table."""
+        assert self._connection is not None
+        con = self._connection
+        rows = con.execute(
+            'SELECT value FROM meta WHERE key = "journal_mode"').fetchall()
+        old = rows[0][0] if rows else 'DELETE'
+        if mode == old:
+            return
+        new, = con.execute(f'PRAGMA journal_mode = {mode}').fetchone()
+        with con:
+            con.execute('DELETE FROM meta WHERE key = "journal_mode"')
+            con.execute('INSERT INTO meta VALUES (?, ?)',
+                        ['journal_mode', new.upper()])
+
+    def find_dependents(self, ids: Iterable[int]) -> Iterator[int]:
+        """Yield dependents (direct and indirect).
+
+        The whole closure is found with one recursive query.  Each
+        dependent is yielded once.
+        """
+        for id, in self.sql(
+                'WITH RECURSIVE dependents(id) AS ('
+                'SELECT id FROM dependencies '
+                'WHERE did IN (SELECT value FROM json_each(?)) '
+                'UNION '
+                'SELECT dependencies.id FROM dependencies '
+                'JOIN dependents ON dependencies.did = dependents.id) '
+                'SELECT id FROM dependents',
+                [json.dumps(list(ids))]):
+            yield id
+
+    def find_ids_and_states(
+            self,
+            names: Iterable[tuple[str, str]],
+            archived: bool = False) -> dict[tuple[str, str],
+                                            tuple[int, str]]:
+        """Find newest task for many (folder, name) pairs in one query.
+
+        The pairs are put in a temporary table that is joined with the
+        folders table and the tasks table (or the archive table if
+        *archived* is True) so that the (fid, name) indices are used.
+        Returns dict mapping (folder, name) to (id, state) for pairs
+        found in the queue.
+        """
+        table = 'archive' if archived else 'tasks'
+        with self.connection as con:
+            con.execute('CREATE TEMP TABLE IF NOT EXISTS names '
+                        '(folder TEXT, name TEXT)')
+            con.execute('DELETE FROM temp.names')
+            con.executemany('INSERT INTO temp.names VALUES (?, ?)',
+                            dict.fromkeys(names))
+            rows = con.execute(
+                'SELECT names.folder, names.name, MAX(t.id), t.state '
+                'FROM temp.names '
+                'JOIN folders ON folders.folder = names.folder '
+                f'JOIN {table} AS t '
+                'ON t.fid = folders.id AND t.name = names.name '
+                'GROUP BY names.folder, names.name').fetchall()
+            con.execute('DELETE FROM temp.names')
+        return {(folder, name): (id, state)
+                for folder, name, id, state in rows}
+
+    def get_manifests(
+            self,
+            keys: Iterable[tuple[str, str]]) -> dict[tuple[str, str], str]:
+        """Get workflow manifests for (folder, script) pairs."""
+        with self.connection as con:
+            con.execute('CREATE TEMP TABLE IF NOT EXISTS manifest_keys '
+                        '(folder TEXT, script TEXT)')
+            con.execute('DELETE FROM temp.manifest_keys')
+            con.executemany('INSERT INTO temp.manifest_keys VALUES (?, ?)',
+                            dict.fromkeys(keys))
+            rows = con.execute(
+                'SELECT m.folder, m.script, m.data '
+                'FROM temp.manifest_keys AS k JOIN manifests AS m '
+                'ON m.folder = k.folder AND m.script = k.script').fetchall()
+            con.execute('DELETE FROM temp.manifest_keys')
+        return {(folder, script): data for folder, script, data in rows}
+
+    def set_manifests(
+            self,
+            manifests: dict[tuple[str, str], str | None]) -> None:
+        """Write (or remove if None) workflow manifests."""
+        if self.dry_run:
+            return
+        with self.connection as con:
+            con.executemany(
+                'INSERT OR REPLACE INTO manifests VALUES (?, ?, ?)',
+                [(folder, script, data)
+                 for (folder, script), data in manifests.items()
+                 if data is not None])
+            con.executemany(
+                'DELETE FROM manifests WHERE folder = ? AND script = ?',
+                [key for key, data in manifests.items() if data is None])
 
     def cancel_dependents(self, ids: Iterable[int]) -> None:
         """Set state of dependents to CANCELED."""
@@ -239,17 +666,49 @@ class Queue:
             con.executemany('DELETE FROM dependencies WHERE id = ?', args)
             con.executemany('DELETE FROM dependencies WHERE did = ?', args)
             con.executemany('DELETE FROM tasks WHERE id = ?', args)
+            con.execute('DELETE FROM folders WHERE id NOT IN '
+                        '(SELECT fid FROM tasks UNION '
+                        'SELECT fid FROM archive)')
+            con.execute('DELETE FROM commands WHERE id NOT IN '
+                        '(SELECT cid FROM tasks UNION '
+                        'SELECT cid FROM archive)')
+
+    def archive(self, ids: Iterable[int]) -> int:
+        """Move finished tasks to the archive table.
+
+        Tasks that are queued, on hold or running are left alone.
+        Returns the number of archived tasks.
+        """
+        if self.dry_run:
+            return 0
+        with self.connection as con:
+            con.execute('CREATE TEMP TABLE IF NOT EXISTS archive_ids '
+                        '(id INTEGER PRIMARY KEY)')
+            con.execute('DELETE FROM temp.archive_ids')
+            con.executemany(
+                'INSERT OR IGNORE INTO temp.archive_ids SELECT id FROM tasks '
+                'WHERE id = ? AND state IN ("d", "F", "C", "T", "M")',
+                [[id] for id in ids])
+            con.execute('INSERT INTO archive SELECT * FROM tasks '
+                        'WHERE id IN temp.archive_ids')
+            con.execute('DELETE FROM dependencies '
+                        'WHERE id IN temp.archive_ids '
+                        'OR did IN temp.archive_ids')
+            con.execute('DELETE FROM tasks WHERE id IN temp.archive_ids')
+            n, = con.execute(
+                'SELECT COUNT(*) FROM temp.archive_ids').fetchone()
+            con.execute('DELETE FROM temp.archive_ids')
+        return n
 
     def check_for_timeout(self) -> None:
         """Find "running" tasks that are actually timed out."""
         t = time.time()
 
         timeouts = []
-        for task in self.tasks('state = "r"'):
+        for task in self.tasks('state = "r" AND trunning + tmax < ?', [t]):
             delta = t - task.trunning - task.resources.tmax
-            if delta > 0:
-                if self.scheduler.has_timed_out(task) or delta > 1800:
-                    timeouts.append(task.id)
+            if self.scheduler.has_timed_out(task) or delta > 1800:
+                timeouts.append(task.id)
 
         with self.connection:
             self.connection.executemany(
@@ -268,58 +727,128 @@ class Queue:
                 'UPDATE tasks SET state = ?, error = ? WHERE id = ?', args)
 
     def process_change_files(self) -> None:
-        """Process state-change files from running tasks."""
-        paths = list(self.folder.glob('*-*-*'))
+        """Process state-change files and event logs from running tasks."""
+        changes: list[tuple[float, int, int, Path | None]] = []
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                parts = entry.name.split('-')
+                if len(parts) != 3:
+                    continue
+                try:
+                    id, state = int(parts[1]), int(parts[2])
+                except ValueError:
+                    continue
+                changes.append((entry.stat().st_ctime, id, state,
+                                Path(entry.path)))
+
+        folder = self.folder / 'events'
+        offsets: dict[str, int] = {}
+        new: dict[str, int] = {}
+        if folder.is_dir():
+            offsets = {
+                key[7:]: int(value)
+                for key, value in self.connection.execute(
+                    'SELECT key, value FROM meta WHERE key GLOB ?',
+                    [f'events:{self.config.user}@*'])}
+            new = dict(offsets)
+            for t, id, state in read_events(folder, self.config.user, new):
+                changes.append((t, id, state, None))
+            offsets = {name: offset for name, offset in new.items()
+                       if offsets.get(name) != offset}
+
+        if changes or offsets:
+            self.update_tasks(sorted(changes, key=lambda c: c[:3]),
+                              offsets)
+
+        removed = remove_old_logs(folder, new)
+        if removed:
+            with self.connection as con:
+                con.executemany('DELETE FROM meta WHERE key = ?',
+                                [(f'events:{name}',) for name in removed])
+
+    def update_tasks(self,
+                     changes: list[tuple[float, int, int, Path | None]],
+                     offsets: dict[str, int] = None) -> None:
+        """Update tasks from (ctime, id, state, path) tuples.
+
+        All updates are done in one transaction.  Changes are applied in
+        the given order.  The path is None for changes read from an event
+        log and *offsets* (new read positions for the event logs) are
+        written to the meta table in the same transaction.
+        """
         states = {0: State.running,
                   1: State.done,
                   2: State.FAILED,
-                  3: State.TIMEOUT}
-        files = []
-        for path in paths:
-            id, state = (int(x) for x in path.name.split('-')[1:])
-            files.append((path.stat().st_ctime, id, state, path))
-
-        for ctime, id, state, path in sorted(files):
-            self.update_one_task(id, states[state], ctime, path)
-
-    def update_one_task(self,
-                        id: int,
-                        newstate: State,
-                        ctime: float,
-                        path: Path) -> None:
-        """Update single task."""
-        try:
-            (user,), = self.sql('SELECT user FROM tasks WHERE id = ?', [id])
-        except ValueError:
-            print(f'No such task: {id}, {newstate}', file=sys.stderr)
-            return
+                  3: State.TIMEOUT,
+                  4: State.CANCELED}
+
+        # One JSON argument instead of one "?" per id (older SQLite
+        # versions allow only 999 variables):
+        ids = json.dumps(list({id for _, id, _, _ in changes}))
+        users: dict[int, str] = dict(
+            self.connection.execute(
+                'SELECT id, user FROM tasks '
+                'WHERE id IN (SELECT value FROM json_each(?))', [ids]))
+
+        rows: list[tuple[str, float | None, float | None, int]] = []
+        done = []
+        bad = []
+        paths = []
+        for ctime, id, state, path in changes:
+            newstate = states[state]
+            user = users.get(id)
+            if user is None:
+                print(f'No such task: {id}, {newstate}', file=sys.stderr)
+                continue
+            if user != self.config.user:
+                continue
+            if newstate is State.running:
+                rows.append((newstate.value, ctime, None, id))
+            else:
+                rows.append((newstate.value, None, ctime, id))
+                if newstate is State.done:
+                    done.append((id,))
+                else:
+                    bad.append(id)
+            if path is not None:
+                paths.append(path)
 
-        if user != self.config.user:
-            return
+        offsets = offsets or {}
+        self.cancel_dependents(bad)
+        with self.connection as con:
+            con.executemany('DELETE FROM dependencies WHERE did = ?', done)
+            con.executemany(
+                'UPDATE tasks SET state = ?, '
+                'trunning = COALESCE(?, trunning), '
+                'tstop = COALESCE(?, tstop) '
+                'WHERE id = ?',
+                rows)
+            con.executemany('DELETE FROM meta WHERE key = ?',
+                            [(f'events:{name}',) for name in offsets])
+            con.executemany('INSERT INTO meta VALUES (?, ?)',
+                            [(f'events:{name}', str(offset))
+                             for name, offset in offsets.items()])
 
-        if newstate == 'done':
-            with self.connection as con:
-                con.execute('DELETE FROM dependencies WHERE did = ?', [id])
-            with self.connection as con:
-                con.execute(
-                    'UPDATE tasks SET state = "d", tstop = ? WHERE id = ?',
-                    [ctime, id])
+        for path in paths:
+            path.unlink()
 
-        elif newstate == 'running':
-            with self.connection as con:
-                con.execute(
-                    'UPDATE tasks SET state = "r", trunning = ? WHERE id = ?',
-                    [ctime, id])
 
-        else:
-            assert newstate in ['FAILED', 'TIMEOUT', 'MEMORY']
-            self.cancel_dependents([id])
-            with self.connection as con:
-                con.execute(
-                    'UPDATE tasks SET state = ?, tstop = ? WHERE id = ?',
-                    [newstate.value, ctime, id])
+def insert_tasks(con: sqlite3.Connection, rows: list[tuple]) -> None:
+    """Insert rows from Task.to_sql() into the tasks table.
 
-        path.unlink()
+    Folders and commands are added to the folders and commands tables
+    (if they are not already there) and replaced by their ids.
+    """
+    con.executemany('INSERT OR IGNORE INTO folders (folder) VALUES (?)',
+                    [(row[1],) for row in rows])
+    con.executemany('INSERT OR IGNORE INTO commands (cmd) VALUES (?)',
+                    [(row[4],) for row in rows])
+    q = ', '.join('?' * 16)
+    con.executemany(
+        'INSERT INTO tasks VALUES (?, '
+        '(SELECT id FROM folders WHERE folder = ?), ?, ?, '
+        f'(SELECT id FROM commands WHERE cmd = ?), {q})',
+        rows)
 
 
 def sort_out_dependencies(tasks: Sequence[Task],
@@ -337,6 +866,28 @@ def sort_out_dependencies(tasks: Sequence[Task],
         for task in done:
             name_to_id_and_state[str(task.dname.relative_to(root))] = (0, 'd')
 
+    # Look up all dependencies that are not in tasks or done in one go:
+    missing = {str(dname.relative_to(root)): dname
+               for task in tasks
+               for dname in task.deps}
+    missing = {name: dname for name, dname in missing.items()
+               if name not in name_to_task and
+               name not in name_to_id_and_state}
+    if missing:
+        assert queue is not None
+        keys = {name: (normalize_folder(dname.parent, root), dname.name)
+                for name, dname in missing.items()}
+        found = queue.find_ids_and_states(keys.values())
+        # Finished tasks may have been moved to the archive:
+        archived = queue.find_ids_and_states(
+            (key for key in keys.values() if key not in found),
+            archived=True)
+        for name, key in keys.items():
+            if key in found:
+                name_to_id_and_state[name] = found[key]
+            elif key in archived:
+                name_to_id_and_state[name] = archived[key]
+
     skipped = 0
     for task in tasks:
         task.dtasks = []
@@ -347,15 +898,7 @@ def sort_out_dependencies(tasks: Sequence[Task],
             if dtask is None:
                 id, state = name_to_id_and_state.get(name, (-1, ''))
                 if id == -1:
-                    assert queue is not None
-                    rows = queue.sql(
-                        'SELECT id, state FROM tasks '
-                        'WHERE name = ? AND folder = ?',
-                        [dname.name, normalize_folder(dname.parent, root)])
-                    id, state = max(rows, default=(-1, ''))
-                    if id == -1:
-                        raise DependencyError(f"Can't find {name}")
-                    name_to_id_and_state[name] = id, state
+                    raise DependencyError(f"Can't find {name}")
                 if state in 'qhr':
                     dtask = create_task('dummy')
                     dtask.id = id
@@ -383,11 +926,10 @@ def dump_db(path: Path) -> None:
     prnt = Console().print
     db = sqlite3.connect(path)
     table = Table(title=str(path))
-    columns = [line.strip().split()[0]
-               for line in INIT.split(';', maxsplit=1)[0].splitlines()[1:]]
-    for name in columns:
+    cur = db.execute('SELECT * from tasks_view')
+    for name, *_ in cur.description:
         table.add_column(name)
-    for row in db.execute('SELECT * from tasks'):
+    for row in cur:
         table.add_row(*[str(x) for x in row])
     prnt(table)
 
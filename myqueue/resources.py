@@ -44,6 +44,9 @@ def T(t: str) -> int:
 
 class Resources:
     """Resource description."""
+
+    __slots__ = ('cores', 'nodename', 'processes', 'tmax', 'weight')
+
     def __init__(self,
                  cores: int = 0,
                  nodename: str = '',
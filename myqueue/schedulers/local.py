@@ -1,13 +1,28 @@
+"""Local scheduler for running tasks on a single computer.
+
+Start the server with::
+
+    $ python3 -m myqueue.schedulers.local [--unix] [--cores N]
+
+Messages are pickled ``(command, *args)`` tuples and ``(status, result)``
+replies, each prefixed by its length as an 8-byte big-endian integer.
+A client can send any number of messages over one connection.  With
+``--unix``, the server listens on a ``.myqueue/local.sock`` Unix domain
+socket instead of a TCP port on localhost.  Otherwise, the TCP port is
+written to ``.myqueue/local.port`` so that clients can find it.
+"""
 from __future__ import annotations
 
+import asyncio
 import pickle
 import socket
-import subprocess
+import struct
 import threading
-from functools import partial
+from collections import defaultdict
+from heapq import heappop, heappush
 from multiprocessing import cpu_count
-from queue import Queue as FIFOQueue
-from typing import Any
+from pathlib import Path
+from typing import Any, Iterator, Sequence
 
 from myqueue.config import Configuration
 from myqueue.queue import Queue
@@ -15,14 +30,33 @@ from myqueue.schedulers import Scheduler
 from myqueue.states import State
 from myqueue.task import Task
 
+HEADER = struct.Struct('!Q')
+
 
 class LocalSchedulerError(Exception):
     pass
 
 
+def socket_path(config: Configuration) -> Path:
+    """Unix domain socket used by server started with --unix."""
+    return config.home / '.myqueue' / 'local.sock'
+
+
+def port_path(config: Configuration) -> Path:
+    """File with the TCP port of the running server."""
+    return config.home / '.myqueue' / 'local.port'
+
+
 class LocalScheduler(Scheduler):
     port = 39999
 
+    def __init__(self, config: Configuration):
+        Scheduler.__init__(self, config)
+        self.socket: socket.socket | None = None
+        # Tasks may be submitted from several threads (see
+        # submit_tasks_concurrently()):
+        self.lock = threading.Lock()
+
     def submit(self,
                task: Task,
                dry_run: bool = False,
@@ -35,6 +69,25 @@ class LocalScheduler(Scheduler):
         id = self.send('submit', task)
         return id
 
+    def submit_many(self,
+                    tasks: Sequence[Task],
+                    dry_run: bool = False,
+                    verbose: bool = False) -> Iterator[int]:
+        """Submit all tasks in one message.
+
+        Tasks in the batch may depend on each other.  The server assigns
+        the ids in order.
+        """
+        if dry_run:
+            for task in tasks:
+                yield self.submit(task, dry_run, verbose)
+            return
+        for task in tasks:
+            task.cmd.function = None
+            for dep in task.dtasks:
+                dep.cmd.function = None
+        yield from self.send('submit_many', list(tasks))
+
     def cancel(self, id: int) -> None:
         self.send('cancel', id)
 
@@ -48,22 +101,46 @@ class LocalScheduler(Scheduler):
         ids = self.send('list')
         return ids
 
+    def connect(self) -> socket.socket:
+        path = socket_path(self.config)
+        if path.is_socket():
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            address: str | tuple[str, int] = str(path)
+        else:
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            try:
+                port = int(port_path(self.config).read_text())
+            except (FileNotFoundError, ValueError):
+                port = self.port
+            address = ('127.0.0.1', port)
+        try:
+            s.connect(address)
+        except (ConnectionRefusedError, FileNotFoundError):
+            s.close()
+            raise ConnectionRefusedError(
+                'This machine will, will not communicate!  '
+                'Please start a local scheduler with:\n\n'
+                '    python3 -m myqueue.schedulers.local\n')
+        return s
+
     def send(self, *args: Any) -> Any:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        """Send message and wait for reply.
+
+        The connection is kept open for the next message.
+        """
+        with self.lock:
+            if self.socket is None:
+                self.socket = self.connect()
             try:
-                s.connect(('127.0.0.1', self.port))
-            except ConnectionRefusedError:
-                raise ConnectionRefusedError(
-                    'This machine will, will not communicate!  '
-                    'Please start a local scheduler with:\n\n'
-                    '    python3 -m myqueue.schedulers.local\n')
-            b = pickle.dumps(args)
-            assert len(b) < 4096
-            s.sendall(b)
+                send_message(self.socket, args)
+                status, result = receive_message(self.socket)
+            except (ConnectionError, EOFError):
+                self.socket.close()
+                self.socket = None
+                raise
             if args[0] == 'stop':
-                return
-            b = b''.join(iter(partial(s.recv, 4096), b''))
-        status, result = pickle.loads(b)
+                self.socket.close()
+                self.socket = None
         if status != 'ok':
             raise LocalSchedulerError(status)
         return result
@@ -73,115 +150,197 @@ class LocalScheduler(Scheduler):
         return [], []
 
 
+def send_message(s: socket.socket, message: Any) -> None:
+    """Send length-prefixed pickle."""
+    b = pickle.dumps(message)
+    s.sendall(HEADER.pack(len(b)) + b)
+
+
+def receive_message(s: socket.socket) -> Any:
+    """Receive length-prefixed pickle."""
+    n, = HEADER.unpack(receive_bytes(s, HEADER.size))
+    return pickle.loads(receive_bytes(s, n))
+
+
+def receive_bytes(s: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        b = s.recv(min(n - len(buf), 1 << 20))
+        if not b:
+            raise EOFError('Connection closed')
+        buf += b
+    return bytes(buf)
+
+
 class Server:
     """Run tasks in subprocesses."""
     def __init__(self,
                  config: Configuration,
                  cores: int = 1,
-                 port: int = 39999) -> None:
+                 port: int = 39999,
+                 unix: bool = False) -> None:
         self.config = config
         self.cores = cores
         self.port = port
+        self.unix = unix
 
         with Queue(config) as queue:
+            # Don't reuse ids of archived tasks:
             maxid = queue.connection.execute(
-                'SELECT MAX(id) FROM tasks').fetchone()[0] or 0
+                'SELECT MAX(id) FROM (SELECT MAX(id) AS id FROM tasks '
+                'UNION ALL SELECT MAX(id) FROM archive)').fetchone()[0] or 0
             self.next_id = 1 + maxid
 
         self.tasks: dict[int, Task] = {}
-        self.running: dict[int, tuple[threading.Thread, subprocess.Popen]] = {}
-        self.folder = self.config.home / '.myqueue'
-        self.queue: FIFOQueue = FIFOQueue()
-        self.loop_thread = threading.Thread(target=self.loop)
-        self.lock = threading.Lock()  # use this XXXX
+        self.running: dict[int, asyncio.subprocess.Process] = {}
+        self.jobs: set[asyncio.Task[None]] = set()
+        # Final states of tasks that are no longer in self.tasks:
+        self.finished: dict[int, State] = {}
+
+        # Dispatch bookkeeping:
+        self.free = cores
+        # Number of unfinished dependencies for each queued task:
+        self.pending: dict[int, int] = {}
+        # Tasks waiting for a given task to finish:
+        self.dependents: defaultdict[int, list[int]] = defaultdict(list)
+        # Heaps of ids of ready tasks (no pending dependencies).
+        # One heap for each core-count:
+        self.ready: defaultdict[int, list[int]] = defaultdict(list)
+
+        self.stopped: asyncio.Event | None = None
+        # For reporting state changes the same way as other schedulers:
+        self.scheduler = LocalScheduler(config)
 
     def run(self) -> None:
         """Start server and wait for commands."""
-        self.loop_thread.start()
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        asyncio.run(self.serve())
+
+    async def serve(self) -> None:
+        self.stopped = asyncio.Event()
+        server: asyncio.AbstractServer
+        if self.unix:
+            path = socket_path(self.config)
+            server = await asyncio.start_unix_server(self.handle, str(path))
+        else:
             for p in range(self.port, self.port + 10):
                 try:
-                    s.bind(('', p))
+                    server = await asyncio.start_server(self.handle,
+                                                        '127.0.0.1', p)
                 except OSError:
                     continue
                 break
             else:
-                1 / 0
+                raise OSError('No free port')
             self.port = p
-            s.listen(1)
+            port_path(self.config).write_text(f'{p}\n')
+        async with server:
+            await self.stopped.wait()
+        if self.unix:
+            path.unlink()
+        else:
+            port_path(self.config).unlink(missing_ok=True)
+        # Let running tasks finish:
+        while self.jobs:
+            await asyncio.wait(self.jobs)
+
+    async def handle(self,
+                     reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        """Serve one client until it disconnects."""
+        try:
             while True:
-                conn, addr = s.accept()
-                with conn:
-                    print('Connected by', addr)
-                    data = conn.recv(1024)
-                    cmd, *args = pickle.loads(data)
-                    print('COMMAND:', cmd, *args)
-                    result = getattr(self, cmd)(*args)
-                    print('RESULT:', result)
-                    conn.sendall(pickle.dumps(('ok', result)))
-                    self.queue.put(cmd)
-                    if cmd == 'stop':
-                        break
-        self.loop_thread.join()
-
-    def stop(self) -> None:
-        pass
-
-    def submit(self, task: Task) -> int:
-        task.id = self.next_id
-        task.state = State.queued
-        assert all(t.id in self.tasks for t in task.dtasks)
-        task.deps = [t.dname for t in task.dtasks]
-        self.tasks[task.id] = task
+                try:
+                    header = await reader.readexactly(HEADER.size)
+                except asyncio.IncompleteReadError:
+                    break
+                n, = HEADER.unpack(header)
+                cmd, *args = pickle.loads(await reader.readexactly(n))
+                try:
+                    result = getattr(self, 'do_' + cmd)(*args)
+                except Exception as ex:
+                    reply: tuple[str, Any] = (f'{ex!r}', None)
+                else:
+                    reply = ('ok', result)
+                b = pickle.dumps(reply)
+                writer.write(HEADER.pack(len(b)) + b)
+                await writer.drain()
+                if cmd == 'stop':
+                    break
+                self.kick()
+        finally:
+            writer.close()
+
+    def do_stop(self) -> None:
+        assert self.stopped is not None
+        self.stopped.set()
+
+    def do_submit(self, task: Task) -> int:
+        id = self.next_id
         self.next_id += 1
-        return task.id
+        task.id = id
+        task.state = State.queued
+        pending = 0
+        for t in task.dtasks:
+            if t.id in self.tasks:
+                self.dependents[t.id].append(id)
+                pending += 1
+            elif self.finished.get(t.id, State.done) is not State.done:
+                task.state = State.CANCELED
+        if task.state is State.CANCELED:
+            self.finished[id] = task.state
+            return id
+        self.tasks[id] = task
+        self.pending[id] = pending
+        if pending == 0:
+            heappush(self.ready[task.resources.cores], id)
+        return id
+
+    def do_submit_many(self, tasks: list[Task]) -> list[int]:
+        return [self.do_submit(task) for task in tasks]
 
-    def list(self) -> list[int]:
+    def do_list(self) -> list[int]:
         return list(self.tasks)
 
-    def cancel(self, id: int) -> None:
+    def do_cancel(self, id: int) -> None:
         if id in self.running:
-            self.running[id][1].terminate()
+            self.tasks[id].state = State.CANCELED
+            self.running[id].terminate()
         elif id in self.tasks:
-            task = self.tasks[id]
-            task.state = State.CANCELED
-            self.cancel_dependents(task)
-        return None
-
-    def loop(self) -> None:
-        """Check if a new task should be started."""
-        cmd = ''
-        while cmd != 'stop':
-            cmd = self.queue.get()
-            self.kick()
+            self.remove(id, State.CANCELED)
+            self.cancel_dependents(id)
 
     def kick(self) -> None:
-        remove = []
-        for id, (thread, proc) in self.running.items():
-            if id not in self.tasks:
-                thread.join()
-                remove.append(id)
-        for id in remove:
-            del self.running[id]
-
-        free = self.cores
-        for task in self.tasks.values():
-            if task.state == State.running:
-                free -= task.resources.cores
-            if free <= 0:
-                return
-
-        for task in self.tasks.values():
-            ok = (task.state == State.queued and
-                  not task.deps and
-                  task.resources.cores <= free)
-            if ok:
-                self.start(task)
-                free -= task.resources.cores
-                if free <= 0:
-                    return
-
-    def start(self, task: Task) -> None:
+        """Start new tasks if there are free cores.
+
+        Ready tasks are started in order of submission, skipping tasks
+        that need more cores than are free.
+        """
+        if self.stopped is not None and self.stopped.is_set():
+            return
+
+        while (task := self.next_task()) is not None:
+            job = asyncio.create_task(self.execute(task))
+            self.jobs.add(job)
+            job.add_done_callback(self.jobs.discard)
+
+    def next_task(self) -> Task | None:
+        """Find next ready task that fits and mark it as running."""
+        best = None
+        for cores, heap in self.ready.items():
+            # Drop ids of canceled tasks:
+            while heap and heap[0] not in self.tasks:
+                heappop(heap)
+            if heap and cores <= self.free:
+                if best is None or heap[0] < self.ready[best][0]:
+                    best = cores
+        if best is None:
+            return None
+        task = self.tasks[heappop(self.ready[best])]
+        task.state = State.running
+        self.free -= best
+        return task
+
+    async def execute(self, task: Task) -> None:
         """Run a task."""
         out = f'{task.cmd.short_name}.{task.id}.out'
         err = f'{task.cmd.short_name}.{task.id}.err'
@@ -194,51 +353,85 @@ class Server:
                                         self.config.parallel_python)
         cmd = f'{cmd} 2> {err} > {out}'
 
-        proc = subprocess.Popen(cmd, shell=True, cwd=task.folder)
-        thread = threading.Thread(target=self.target, args=(task.id,))
-        self.running[task.id] = (thread, proc)
-        thread.start()
-
-    def target(self, id: int) -> None:
-        task = self.tasks[id]
-        tmax = task.resources.tmax
-        task.state = State.running
-        (self.folder / f'local-{id}-0').write_text('')  # running
-        thread, proc = self.running[id]
+        self.scheduler.report_state(task.id, 0)  # running
+        proc = await asyncio.create_subprocess_shell(cmd, cwd=task.folder)
+        self.running[task.id] = proc
         try:
-            proc.communicate(timeout=tmax)
-        except subprocess.TimeoutExpired:
+            await asyncio.wait_for(proc.wait(), timeout=task.resources.tmax)
+        except asyncio.TimeoutError:
             task.state = State.TIMEOUT
-
-        del self.tasks[task.id]
-
-        if proc.returncode == 0:
-            for t in self.tasks.values():
-                if task.dname in t.deps:
-                    t.deps.remove(task.dname)
+            proc.terminate()
+            await proc.wait()
+        del self.running[task.id]
+        self.scheduler.report_state(task.id,
+                                    self.finish(task, proc.returncode))
+        self.kick()
+
+    def finish(self, task: Task, returncode: int | None) -> int:
+        """Update bookkeeping for finished task.
+
+        Returns state number for report_state().
+        """
+        self.free += task.resources.cores
+
+        if returncode == 0:
+            task.state = State.done
             state = 1
+        elif task.state is State.TIMEOUT:
+            state = 3
+        elif task.state is State.CANCELED:
+            state = 4
         else:
-            if task.state == 'TIMEOUT':
-                state = 3
-            else:
-                state = 2
-            self.cancel_dependents(task)
-
-        (self.folder / f'local-{task.id}-{state}').write_text('')
-
-        self.queue.put('join')
-
-    def _cancel_dependents(self, task: Task) -> None:
-        for job in self.tasks.values():
-            if task.dname in job.deps:
-                job.state = State.CANCELED
-                self._cancel_dependents(job)
-
-    def cancel_dependents(self, task: Task) -> None:
-        self._cancel_dependents(task)
-        self.tasks = {id: task for id, task in self.tasks.items()
-                      if task.state != State.CANCELED}
+            task.state = State.FAILED
+            state = 2
+        self.remove(task.id, task.state)
+
+        if task.state is State.done:
+            for id in self.dependents.pop(task.id, []):
+                if id in self.tasks:
+                    self.pending[id] -= 1
+                    if self.pending[id] == 0:
+                        t = self.tasks[id]
+                        heappush(self.ready[t.resources.cores], id)
+        else:
+            self.cancel_dependents(task.id)
+        return state
+
+    def remove(self, id: int, state: State) -> None:
+        """Move task from self.tasks to self.finished."""
+        task = self.tasks.pop(id)
+        task.state = state
+        del self.pending[id]
+        self.finished[id] = state
+
+    def cancel_dependents(self, id: int) -> None:
+        """Cancel all tasks depending directly or indirectly on task."""
+        ids = self.dependents.pop(id, [])
+        while ids:
+            id = ids.pop()
+            if id in self.tasks:
+                self.remove(id, State.CANCELED)
+            ids += self.dependents.pop(id, [])
+
+
+def main() -> None:
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='python3 -m myqueue.schedulers.local',
+        description='Run tasks on this computer.')
+    parser.add_argument('--cores', type=int, default=cpu_count(),
+                        help='Number of cores to use.  Default is all.')
+    parser.add_argument('--port', type=int, default=LocalScheduler.port,
+                        help='TCP port to listen on (default: %(default)s).')
+    parser.add_argument('--unix', action='store_true',
+                        help='Listen on .myqueue/local.sock Unix domain '
+                        'socket instead of a TCP port.')
+    args = parser.parse_args()
+    Server(Configuration.read(),
+           cores=args.cores,
+           port=args.port,
+           unix=args.unix).run()
 
 
 if __name__ == '__main__':
-    Server(Configuration.read(), cores=cpu_count()).run()
+    main()
@@ -46,21 +46,19 @@ class LSF(Scheduler):
             cmd = 'mpiexec ' + cmd.replace('python3',
                                            self.config.parallel_python)
 
-        home = self.config.home
-
         script = (
             '#!/bin/bash -l\n'
-            'export MYQUEUE_TASK_ID=$LSB_JOBID\n'
-            f'mq={home}/.myqueue/lsf-$MYQUEUE_TASK_ID\n')
+            'export MYQUEUE_TASK_ID=$LSB_JOBID\n')
+        script += self.get_state_function()
 
         script += self.get_venv_activation_line()
 
         script += (
-            '(touch $mq-0 && \\\n'
+            '(mqstate 0 && \\\n'
             f' cd {str(task.folder)!r} && \\\n'
             f' {cmd} && \\\n'
-            ' touch $mq-1) || \\\n'
-            '(touch $mq-2; exit 1)\n')
+            ' mqstate 1) || \\\n'
+            '(mqstate 2; exit 1)\n')
 
         # print(' \\\n    '.join(bsub))
         # print(script)
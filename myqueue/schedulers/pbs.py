@@ -53,18 +53,16 @@ class PBS(Scheduler):
         else:
             cmd = 'MPLBACKEND=Agg ' + cmd
 
-        home = self.config.home
-
         script = '#!/bin/bash -l\n'
 
         script += self.get_venv_activation_line()
 
         script += (
             '#!/bin/bash -l\n'
-            'export MYQUEUE_TASK_ID=${PBS_JOBID%.*}\n'
-            f'mq={home}/.myqueue/pbs-$MYQUEUE_TASK_ID\n'
-            f'(touch $mq-0 && cd {task.folder} && {cmd} && touch $mq-1) || '
-            'touch $mq-2\n')
+            'export MYQUEUE_TASK_ID=${PBS_JOBID%.*}\n' +
+            self.get_state_function() +
+            f'(mqstate 0 && cd {task.folder} && {cmd} && mqstate 1) || '
+            'mqstate 2\n')
 
         if dry_run:
             print(qsub, script)
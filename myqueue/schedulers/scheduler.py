@@ -2,8 +2,10 @@ from __future__ import annotations
 
 import os
 from pathlib import Path
+from typing import Iterator, Sequence
 
 from myqueue.config import Configuration
+from myqueue.events import shell_function, write_event
 from myqueue.task import Task
 
 
@@ -21,6 +23,27 @@ class Scheduler:
                     f'echo "venv: {self.activation_script}"\n')
         return ''
 
+    def get_state_function(self) -> str:
+        """Bash function for reporting state changes: ``mqstate <state>``.
+
+        Depending on the *event_log* configuration, the state is either
+        appended to an event log or reported by touching a file.
+        """
+        folder = self.config.home / '.myqueue'
+        if self.config.event_log:
+            return shell_function(folder / 'events')
+        return ('mqstate() {\n'
+                f'  touch {folder}/{self.name}-$MYQUEUE_TASK_ID-$1\n'
+                '}\n')
+
+    def report_state(self, id: int, state: int) -> None:
+        """Report state change from Python (see get_state_function())."""
+        folder = self.config.home / '.myqueue'
+        if self.config.event_log:
+            write_event(folder / 'events', id, state)
+        else:
+            (folder / f'{self.name}-{id}-{state}').write_text('')
+
     def submit(self,
                task: Task,
                dry_run: bool = False,
@@ -28,6 +51,20 @@ class Scheduler:
         """Submit a task."""
         raise NotImplementedError
 
+    def submit_many(self,
+                    tasks: Sequence[Task],
+                    dry_run: bool = False,
+                    verbose: bool = False) -> Iterator[int]:
+        """Submit several tasks.
+
+        Yields the ids in the same order as the tasks.  The id of a
+        task must be assigned (``task.id = id``) by the caller before the
+        next id is requested, because later tasks may depend on it.
+        The default implementation submits the tasks one at a time.
+        """
+        for task in tasks:
+            yield self.submit(task, dry_run, verbose)
+
     def cancel(self, id: int) -> None:
         """Cancel a task."""
         raise NotImplementedError
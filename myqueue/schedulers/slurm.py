@@ -2,21 +2,63 @@ from __future__ import annotations
 import os
 import subprocess
 from math import ceil
+from shlex import quote
+from typing import Iterator, Sequence
 
 from myqueue.task import Task
 from myqueue.schedulers import Scheduler, SchedulerError
 
 
+def array_task_id(job: int, index: int) -> int:
+    """Combine SLURM job-array id and array index into one MyQueue id.
+
+    >>> array_task_id(42, 3)
+    180388626435
+    """
+    return job << 32 | index
+
+
+def slurm_job_id(id: int) -> str:
+    """Convert MyQueue id to the job id used by SLURM commands.
+
+    >>> slurm_job_id(42)
+    '42'
+    >>> slurm_job_id(array_task_id(42, 3))
+    '42_3'
+    """
+    job, index = divmod(id, 1 << 32)
+    if job:
+        return f'{job}_{index}'
+    return str(id)
+
+
+def parse_job_id(text: str) -> int:
+    """Convert SLURM job id to MyQueue id.
+
+    >>> parse_job_id('117')
+    117
+    >>> parse_job_id('42_3') == array_task_id(42, 3)
+    True
+    """
+    job, _, index = text.partition('_')
+    if index:
+        return array_task_id(int(job), int(index))
+    return int(job)
+
+
 class SLURM(Scheduler):
-    def submit(self,
-               task: Task,
-               dry_run: bool = False,
-               verbose: bool = False) -> int:
+    max_array_size = 1000
+
+    def sbatch_arguments(self, task: Task) -> tuple[list[str], str]:
+        """Find sbatch options and the command to run for a task.
+
+        Options depending on the name and id of the task
+        (``--job-name``, ``--chdir``, ``--output`` and ``--error``)
+        are not included.
+        """
         nodelist = self.config.nodes
         nodes, nodename, nodedct = task.resources.select(nodelist)
 
-        env = []
-
         cmd = str(task.cmd)
 
         if task.resources.processes == 1:
@@ -24,8 +66,6 @@ class SLURM(Scheduler):
             ntasks = task.resources.cores
             cpus_per_task = 1
         else:
-#            if 'OMP_NUM_THREADS' not in os.environ:
-#                env.append(('OMP_NUM_THREADS', '1'))
             mpiexec = self.config.mpiexec
             if 'mpiargs' in nodedct:
                 mpiexec += ' ' + nodedct['mpiargs']
@@ -37,53 +77,52 @@ class SLURM(Scheduler):
         if not os.access(task.folder, os.W_OK | os.X_OK):
             raise IOError(f'{task.folder} folder not writeable!')
 
-        name = task.cmd.short_name
-        sbatch = ['sbatch',
-                  f'--partition={nodename}',
-                  f'--job-name={name}',
+        sbatch = [f'--partition={nodename}',
                   f'--time={ceil(task.resources.tmax / 60)}',
                   f'--ntasks={ntasks}',
                   f'--cpus-per-task={cpus_per_task}',
-                  f'--nodes={nodes}',
-                  f'--chdir={task.folder}',
-                  f'--output={name}.%j.out',
-                  f'--error={name}.%j.err']
+                  f'--nodes={nodes}']
 
         extra_args = self.config.extra_args + nodedct.get('extra_args', [])
         sbatch += extra_args
 
         if task.dtasks:
-            ids = ':'.join(str(tsk.id) for tsk in task.dtasks)
+            ids = ':'.join(slurm_job_id(tsk.id) for tsk in task.dtasks)
             sbatch.append(f'--dependency=afterok:{ids}')
 
+        return sbatch, cmd
+
+    def submit(self,
+               task: Task,
+               dry_run: bool = False,
+               verbose: bool = False) -> int:
+        args, cmd = self.sbatch_arguments(task)
+
+        name = task.cmd.short_name
+        sbatch = ['sbatch',
+                  f'--job-name={name}',
+                  f'--chdir={task.folder}',
+                  f'--output={name}.%j.out',
+                  f'--error={name}.%j.err'] + args
+
         # Use bash for the script
         script = '#!/bin/bash\n'
 
         # Add script commands
         script = self.get_script_commands(task, script)
 
-        # Add environment variables
-        if len(env) > 0:
-            script += '\n'.join(f'export {name}={val}' for name, val in env)
-            script += '\n'
-
-        home = self.config.home
-        script += (
-            'export MYQUEUE_TASK_ID=$SLURM_JOB_ID\n'
-            f'mq={home}/.myqueue/slurm-$MYQUEUE_TASK_ID\n')
+        script += 'export MYQUEUE_TASK_ID=$SLURM_JOB_ID\n'
+        script += self.get_state_function()
 
         script += self.get_venv_activation_line()
 
         script += (
-            '(touch $mq-0 && \\\n'
-            f' cd {str(task.folder)!r} && \\\n'
+            '(mqstate 0 && \\\n'
+            f' cd {quote(str(task.folder))} && \\\n'
             f' {cmd} && \\\n'
-            ' touch $mq-1) || \\\n'
-            '(touch $mq-2; exit 1)\n')
+            ' mqstate 1) || \\\n'
+            '(mqstate 2; exit 1)\n')
 
-#        with open(task.folder / 'debug.txt', 'w') as f:
-#            f.write(script)
-#            f.write('\n  '.join(['#SBATCH ' + s for s in sbatch]))
         if dry_run:
             if verbose:
                 print(' \\\n    '.join(sbatch))
@@ -91,6 +130,93 @@ class SLURM(Scheduler):
                 print(task.script_commands)
             return 1
 
+        return parse_job_id(self.sbatch(sbatch, script))
+
+    def submit_many(self,
+                    tasks: Sequence[Task],
+                    dry_run: bool = False,
+                    verbose: bool = False) -> Iterator[int]:
+        """Submit tasks using job arrays.
+
+        Consecutive tasks with identical sbatch options and script
+        commands that don't depend on each other are submitted as one
+        job array.  The MyQueue id of an array element is created from
+        the job-array id and the array index (see :func:`array_task_id`).
+        """
+        group: list[Task] = []
+        key: tuple[str, ...] = ()
+        for task in tasks:
+            if any(t in group for t in task.dtasks):
+                yield from self.submit_array(group, dry_run, verbose)
+                group = []
+            args, _ = self.sbatch_arguments(task)
+            k = (*args, *task.script_commands)
+            if group and (k != key or len(group) == self.max_array_size):
+                yield from self.submit_array(group, dry_run, verbose)
+                group = []
+            group.append(task)
+            key = k
+        if group:
+            yield from self.submit_array(group, dry_run, verbose)
+
+    def submit_array(self,
+                     tasks: list[Task],
+                     dry_run: bool,
+                     verbose: bool) -> Iterator[int]:
+        """Submit tasks with identical sbatch options as a job array."""
+        if len(tasks) == 1:
+            yield self.submit(tasks[0], dry_run, verbose)
+            return
+
+        args, _ = self.sbatch_arguments(tasks[0])
+
+        home = self.config.home
+        name = tasks[0].cmd.short_name
+        sbatch = ['sbatch',
+                  f'--job-name={name}',
+                  f'--array=0-{len(tasks) - 1}',
+                  f'--chdir={home}',
+                  f'--output={home}/.myqueue/array.%A_%a.out',
+                  f'--error={home}/.myqueue/array.%A_%a.err'] + args
+
+        script = '#!/bin/bash\n'
+        script = self.get_script_commands(tasks[0], script)
+        script += (
+            'export MYQUEUE_TASK_ID='
+            '$(( SLURM_ARRAY_JOB_ID << 32 | SLURM_ARRAY_TASK_ID ))\n')
+        script += self.get_state_function()
+
+        script += self.get_venv_activation_line()
+
+        # Each array element writes its output to the task folder:
+        script += 'case $SLURM_ARRAY_TASK_ID in\n'
+        for index, task in enumerate(tasks):
+            _, cmd = self.sbatch_arguments(task)
+            out = f'{task.cmd.short_name}.$MYQUEUE_TASK_ID'
+            script += (
+                f'{index})\n'
+                '(mqstate 0 && \\\n'
+                f' cd {quote(str(task.folder))} && \\\n'
+                f' {cmd} > {out}.out 2> {out}.err && \\\n'
+                ' mqstate 1) || \\\n'
+                '(mqstate 2; exit 1)\n'
+                ';;\n')
+        script += 'esac\n'
+
+        if dry_run:
+            if verbose:
+                print(' \\\n    '.join(sbatch))
+                print(script)
+            for task in tasks:
+                yield 1
+            return
+
+        job = int(self.sbatch(sbatch, script))
+        for index in range(len(tasks)):
+            yield array_task_id(job, index)
+
+    def sbatch(self, sbatch: list[str], script: str) -> str:
+        """Run sbatch command and return job id."""
         # Use a clean set of environment variables without any MPI stuff:
         p = subprocess.run(sbatch,
                            input=script.encode(),
@@ -100,28 +226,40 @@ class SLURM(Scheduler):
         if p.returncode:
             raise SchedulerError((p.stderr + p.stdout).decode())
 
-        return int(p.stdout.split()[-1].decode())
+        return p.stdout.split()[-1].decode()
 
     def cancel(self, id: int) -> None:
-        subprocess.run(['scancel', str(id)])
+        subprocess.run(['scancel', slurm_job_id(id)])
 
     def hold(self, id: int) -> None:
-        subprocess.run(['scontrol', 'hold', str(id)])
+        subprocess.run(['scontrol', 'hold', slurm_job_id(id)])
 
     def release_hold(self, id: int) -> None:
-        subprocess.run(['scontrol', 'release', str(id)])
+        subprocess.run(['scontrol', 'release', slurm_job_id(id)])
 
     def get_ids(self) -> set[int]:
         user = os.environ.get('USER', 'test')
-        cmd = ['squeue', '--user', user]
+        cmd = ['squeue', '--user', user, '--array']
         p = subprocess.run(cmd, stdout=subprocess.PIPE)
-        queued = {int(line.split()[0].decode())
+        queued = {parse_job_id(line.split()[0].decode())
                   for line in p.stdout.splitlines()[1:]}
         return queued
 
+    def has_timed_out(self, task: Task) -> bool:
+        if task.id >> 32:
+            # SLURM writes its messages for job-array elements here:
+            path = (self.config.home /
+                    f'.myqueue/array.{slurm_job_id(task.id)}.err')
+            if path.is_file():
+                for line in path.read_text().splitlines():
+                    if line.endswith('DUE TO TIME LIMIT ***'):
+                        task.tstop = path.stat().st_mtime
+                        return True
+        return Scheduler.has_timed_out(self, task)
+
     def maxrss(self, id: int) -> int:
         cmd = ['sacct',
-               '-j', str(id),
+               '-j', slurm_job_id(id),
                '-n',
                '--units=K',
                '-o', 'MaxRSS']
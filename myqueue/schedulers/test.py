@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import subprocess
 import sys
+import threading
 
 from myqueue.config import Configuration
 from myqueue.schedulers import Scheduler
@@ -17,6 +18,7 @@ class TestScheduler(Scheduler):
         self.folder = self.config.home / '.myqueue'
         self.tasks: list[Task] = []
         self.number = 0
+        self.lock = threading.Lock()
 
     def submit(self,
                task: Task,
@@ -26,14 +28,15 @@ class TestScheduler(Scheduler):
             return 1
         if task.cmd.args == ['FAIL']:
             raise RuntimeError
-        if task.dtasks:
-            ids = {t.id for t in self.tasks}
-            for t in task.dtasks:
-                assert t.id in ids
-        self.number += 1
-        task.state = State.queued
-        self.tasks.append(task)
-        return self.number
+        with self.lock:
+            if task.dtasks:
+                ids = {t.id for t in self.tasks}
+                for t in task.dtasks:
+                    assert t.id in ids
+            self.number += 1
+            task.state = State.queued
+            self.tasks.append(task)
+            return self.number
 
     def cancel(self, id: int) -> None:
         for i, task in enumerate(self.tasks):
@@ -85,7 +88,7 @@ class TestScheduler(Scheduler):
         activation_script = self.activation_script
         if str(activation_script).startswith('/tmp/pytest-of-'):
             cmd = f'. {activation_script} && ' + cmd
-        (self.folder / f'test-{task.id}-0').write_text('')
+        self.report_state(task.id, 0)
         tmax = task.resources.tmax
         try:
             result = subprocess.run(cmd,
@@ -106,14 +109,15 @@ class TestScheduler(Scheduler):
              State.FAILED: 2,
              State.TIMEOUT: 3}[state]
 
-        (self.folder / f'test-{task.id}-{n}').write_text('')
+        self.report_state(task.id, n)
 
         if state == 'done':
             tasks = []
             for j in self.tasks:
                 if j is not task:
                     if task.dname in j.deps:
-                        j.deps.remove(task.dname)
+                        j.deps = [dname for dname in j.deps
+                                  if dname != task.dname]
                     tasks.append(j)
             self.tasks = tasks
         else:
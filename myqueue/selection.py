@@ -1,8 +1,33 @@
 from __future__ import annotations
+import json
 from pathlib import Path
 
 from myqueue.states import State
-from myqueue.utils import normalize_folder
+from myqueue.utils import folder_range, normalize_folder
+
+# ORDER BY clauses for the sort columns of "mq list" that SQLite can handle
+# (see Task.order_key()).  The state letters sort like the state names.
+SQL_ORDER = {'i': ['id'],
+             'f': ['folder', 'id'],
+             'n': ['name', 'id'],
+             'r': ['cores * tmax', 'id'],
+             'a': ['tqueued', 'id'],
+             's': ['state', 'id'],
+             'e': ['error', 'id']}
+
+
+def sql_order_statement(column: str, reverse: bool = False) -> str:
+    """ORDER BY clause for sorting on column (empty if not possible).
+
+    >>> sql_order_statement('f', reverse=True)
+    'folder DESC, id DESC'
+    >>> sql_order_statement('t')
+    ''
+    """
+    names = SQL_ORDER.get(column, [])
+    if reverse:
+        names = [f'{name} DESC' for name in names]
+    return ', '.join(names)
 
 
 class Selection:
@@ -40,6 +65,20 @@ class Selection:
                 f'{self.folders}, {self.recursive}, {self.error})')
 
     def sql_where_statement(self, root: Path) -> tuple[str, list]:
+        """SQL WHERE statement and arguments for selection.
+
+        Recursive folder selection uses one range of folder names for
+        each folder so that SQLite can use an index (several ranges are
+        passed as one JSON argument):
+
+        >>> root = Path('/home/user')
+        >>> s = Selection(folders=[root / 'a', root / 'a/b', root / 'c'])
+        >>> s.sql_where_statement(root)[1]
+        ['[["./a/", "./a0"], ["./c/", "./c0"]]']
+        >>> s.folders = [root / 'a', root / 'a/b']
+        >>> s.sql_where_statement(root)
+        ('(folder >= ? AND folder < ?)', ['./a/', './a0'])
+        """
         if self.ids is not None:
             q = ', '.join('?' * len(self.ids))
             return (f'id IN ({q})', list(self.ids))
@@ -52,16 +91,35 @@ class Selection:
             args += [state.value for state in self.states]
 
         if self.folders:
-            part = []
-            for folder in self.folders:
-                f = normalize_folder(folder, root)
-                if self.recursive:
-                    part.append('folder GLOB ?')
-                    args.append(f'{f}*')
+            folders = sorted({normalize_folder(folder, root)
+                              for folder in self.folders})
+            if not self.recursive:
+                if len(folders) == 1:
+                    parts.append('folder = ?')
+                    args += folders
+                else:
+                    parts.append(
+                        'folder IN (SELECT value FROM json_each(?))')
+                    args.append(json.dumps(folders))
+            elif folders[0] != './':  # root folder selects everything
+                # One range per folder (subfolders of other folders in
+                # the list are already covered):
+                ranges: list[tuple[str, str]] = []
+                for f in folders:
+                    if not ranges or f >= ranges[-1][1]:
+                        ranges.append(folder_range(f))
+                if len(ranges) == 1:
+                    parts.append('folder >= ? AND folder < ?')
+                    args += ranges[0]
                 else:
-                    part.append('folder = ?')
-                    args.append(f)
-            parts.append(f'({" OR ".join(part)})')
+                    # A long chain of ORs is slow to parse and can't be
+                    # longer than 1000, so we pass the ranges as JSON:
+                    parts.append(
+                        'folder IN (SELECT folder FROM json_each(?) '
+                        'JOIN folders '
+                        "ON folder >= json_extract(value, '$[0]') "
+                        "AND folder < json_extract(value, '$[1]'))")
+                    args.append(json.dumps(ranges))
 
         if self.name:
             parts.append('name GLOB ?')
@@ -45,7 +45,8 @@ class State(Enum):
 
     def __eq__(self, other: object) -> bool:
         if isinstance(other, State):
-            return self.name == other.name
+            # Members are singletons (also after unpickling):
+            return self is other
         if isinstance(other, str):
             if other in State.__members__:
                 return self.name == other
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
+import threading
 import time
 from pathlib import Path
 from types import TracebackType
-from typing import Sequence, TypeVar, TYPE_CHECKING
+from typing import Callable, Mapping, Sequence, TypeVar, TYPE_CHECKING
 
 from myqueue.pretty import pprint
 from myqueue.queue import Queue, sort_out_dependencies
@@ -35,10 +36,13 @@ def submit(queue: Queue,
     sort_out_dependencies(tasks, queue, done)
 
     tasks = [task for task in order({task: task.dtasks for task in tasks})
-             if task.state == State.undefined]
+             if task.state is State.undefined]
 
     tasks = tasks[:max_tasks]
 
+    if queue.config.submission_workers > 1:
+        tasks = [task for level in levels(tasks) for task in level]
+
     default_weight = queue.config.default_task_weight
     for task in tasks:
         task.resources.set_default_weight(default_weight)
@@ -75,7 +79,13 @@ def submit_tasks(scheduler: Scheduler,
                  verbosity: int,
                  dry_run: bool) -> tuple[list[int],
                                          Exception | KeyboardInterrupt | None]:
-    """Submit tasks."""
+    """Submit tasks.
+
+    If the *submission_workers* configuration variable is larger than one,
+    then consecutive tasks that don't depend on each other will be
+    submitted concurrently.  The returned ids will always belong to the
+    first ``len(ids)`` tasks.
+    """
     import rich.progress as progress
 
     ids = []
@@ -90,14 +100,22 @@ def submit_tasks(scheduler: Scheduler,
     else:
         pb = NoProgressBar()
 
+    workers = scheduler.config.submission_workers
+
     with pb:
+        pid = pb.add_task('Submitting tasks:', total=len(tasks))
+        if workers > 1:
+            return submit_tasks_concurrently(scheduler,
+                                             tasks,
+                                             workers,
+                                             verbosity,
+                                             dry_run,
+                                             lambda: pb.advance(pid))
         try:
-            pid = pb.add_task('Submitting tasks:', total=len(tasks))
-            for task in tasks:
-                id = scheduler.submit(
-                    task,
-                    dry_run,
-                    verbosity >= 2)
+            for task, id in zip(tasks,
+                                scheduler.submit_many(tasks,
+                                                      dry_run,
+                                                      verbosity >= 2)):
                 ids.append(id)
                 task.id = id
                 pb.advance(pid)
@@ -107,26 +125,212 @@ def submit_tasks(scheduler: Scheduler,
     return ids, ex
 
 
+def submit_tasks_concurrently(
+        scheduler: Scheduler,
+        tasks: Sequence[Task],
+        workers: int,
+        verbosity: int,
+        dry_run: bool,
+        advance: Callable[[], None]
+) -> tuple[list[int], Exception | KeyboardInterrupt | None]:
+    """Submit batches of independent tasks using a pool of threads.
+
+    Each batch is split into one chunk per worker.  If a chunk fails,
+    then tasks from later chunks in the same batch that were submitted
+    will be canceled so that the submitted tasks are always the first
+    ``len(ids)`` tasks.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    stop = threading.Event()
+
+    def submit_chunk(chunk: list[Task]) -> tuple[list[int],
+                                                 Exception | None]:
+        ids: list[int] = []
+        try:
+            for task, id in zip(chunk,
+                                scheduler.submit_many(chunk,
+                                                      dry_run,
+                                                      verbosity >= 2)):
+                ids.append(id)
+                task.id = id
+                advance()
+                if stop.is_set():
+                    break
+        except Exception as x:
+            return ids, x
+        return ids, None
+
+    ids: list[int] = []
+    ex: Exception | KeyboardInterrupt | None = None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for batch in batches(tasks):
+            n = -(-len(batch) // workers)
+            chunks = [batch[i:i + n] for i in range(0, len(batch), n)]
+            futures = [pool.submit(submit_chunk, chunk) for chunk in chunks]
+            interrupt = None
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except KeyboardInterrupt as x:
+                    stop.set()
+                    interrupt = x
+                    results.append(future.result())
+
+            orphans: list[int] = []
+            for chunk, (chunk_ids, chunk_ex) in zip(chunks, results):
+                if ex is None:
+                    ids += chunk_ids
+                    if chunk_ex is not None:
+                        ex = chunk_ex
+                    elif len(chunk_ids) < len(chunk):
+                        ex = interrupt
+                else:
+                    orphans += chunk_ids
+            ex = ex or interrupt
+
+            if not dry_run:
+                for id in orphans:
+                    scheduler.cancel(id)
+
+            if ex is not None:
+                break
+
+    return ids, ex
+
+
+def batches(tasks: Sequence[Task]) -> list[list[Task]]:
+    """Split tasks into runs of consecutive tasks independent of each other.
+
+    >>> from myqueue.task import create_task
+    >>> a, b, c = (create_task(name) for name in 'abc')
+    >>> b.dtasks = [a]
+    >>> batches([a, b, c])
+    [[Task(a)], [Task(b), Task(c)]]
+    """
+    result: list[list[Task]] = []
+    batch: set[Task] = set()
+    for task in tasks:
+        if not result or any(t in batch for t in task.dtasks):
+            result.append([])
+            batch = set()
+        result[-1].append(task)
+        batch.add(task)
+    return result
+
+
+def levels(tasks: Sequence[Task]) -> list[list[Task]]:
+    """Split topologically ordered tasks into levels.
+
+    Tasks in a level only depend on tasks in earlier levels.
+
+    >>> from myqueue.task import create_task
+    >>> a, b, c = (create_task(name) for name in 'abc')
+    >>> b.dtasks = [a]
+    >>> levels([a, b, c])
+    [[Task(a), Task(c)], [Task(b)]]
+    """
+    depth: dict[Task, int] = {}
+    result: list[list[Task]] = []
+    for task in tasks:
+        n = max((depth[t] + 1 for t in task.dtasks if t in depth),
+                default=0)
+        depth[task] = n
+        if n == len(result):
+            result.append([])
+        result[n].append(task)
+    return result
+
+
 T = TypeVar('T')
 
 
-def order(nodes: dict[T, list[T]]) -> list[T]:
+def order(nodes: Mapping[T, Sequence[T]]) -> list[T]:
     """Depth first.
 
+    Connected components come in the order of their first node and
+    dependencies come before the nodes that depend on them.
+
     >>> order({1: [2], 2: [], 3: [4], 4: []})
     [2, 1, 4, 3]
+    >>> order({1: [2], 2: [3], 3: [1]})
+    Traceback (most recent call last):
+      ...
+    ValueError: Dependency cycle: 1 -> 2 -> 3 -> 1
     """
-    import networkx as nx  # type: ignore
+    # Undirected graph for finding the connected components:
+    neighbors: dict[T, list[T]] = {node: [] for node in nodes}
+    for node, deps in nodes.items():
+        for dep in deps:
+            neighbors[node].append(dep)
+            neighbors.setdefault(dep, []).append(node)
+
     result: list[T] = []
-    g = nx.Graph(nodes)
-    for component in nx.connected_components(g):
-        dg = nx.DiGraph({node: nodes[node]
-                         for node in component
-                         if node in nodes})
-        result += reversed(list(nx.topological_sort(dg)))
+    seen: set[T] = set()
+    for start in neighbors:
+        if start in seen:
+            continue
+        seen.add(start)
+        component = [start]
+        for node in component:
+            for neighbor in neighbors[node]:
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    component.append(neighbor)
+        result += reversed(topological_sort(component, nodes))
     return result
 
 
+def topological_sort(component: list[T],
+                     nodes: Mapping[T, Sequence[T]]) -> list[T]:
+    """Kahn's algorithm.
+
+    Nodes come before their dependencies.
+    """
+    edges = {node: list(dict.fromkeys(nodes.get(node, [])))
+             for node in component}
+    indegree = dict.fromkeys(component, 0)
+    for deps in edges.values():
+        for dep in deps:
+            indegree[dep] += 1
+
+    result = [node for node in component if indegree[node] == 0]
+    for node in result:  # result grows while we iterate
+        for dep in edges[node]:
+            indegree[dep] -= 1
+            if indegree[dep] == 0:
+                result.append(dep)
+
+    if len(result) < len(component):
+        raise ValueError('Dependency cycle: ' +
+                         ' -> '.join(repr(node)
+                                     for node in find_cycle(edges, indegree)))
+    return result
+
+
+def find_cycle(edges: dict[T, list[T]], indegree: dict[T, int]) -> list[T]:
+    """Find a cycle among the nodes left over by Kahn's algorithm."""
+    # All remaining nodes have a remaining node that depends on them:
+    dependents: dict[T, T] = {}
+    for node, deps in edges.items():
+        if indegree[node] > 0:
+            for dep in deps:
+                dependents[dep] = node
+    node = next(node for node, n in indegree.items() if n > 0)
+    path: dict[T, None] = {}
+    while node not in path:
+        path[node] = None
+        node = dependents[node]
+    cycle = list(path)
+    cycle = cycle[cycle.index(node):]
+    cycle.reverse()  # follow dependencies instead of dependents
+    i = cycle.index(node)
+    cycle = cycle[i:] + cycle[:i]
+    return cycle + [node]
+
+
 class NoProgressBar:
     """Dummy progress-bar."""
     def __enter__(self) -> NoProgressBar:
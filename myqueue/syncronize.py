@@ -13,7 +13,7 @@ def sync(queue: Queue) -> None:
             remove.append(id)
 
     root = queue.folder.parent
-    for id, folder in queue.sql('SELECT id, folder FROM tasks'):
+    for id, folder in queue.sql('SELECT id, folder FROM tasks_view'):
         if not (root / folder).is_dir():
             remove.append(id)
 
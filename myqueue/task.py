@@ -2,9 +2,10 @@ from __future__ import annotations
 
 import json
 import os
+import sys
 import time
 from pathlib import Path
-from typing import TYPE_CHECKING, Any, Iterator
+from typing import TYPE_CHECKING, Any, Callable, Iterator, Sequence
 from warnings import warn
 
 from myqueue.commands import Command, create_command
@@ -17,6 +18,33 @@ if TYPE_CHECKING:
 
 UNSPECIFIED = 'hydelifytskibadut'
 
+# Shared by all tasks with no dependencies, no files, ...  Immutable so
+# that accidental modification fails loudly:
+EMPTY: Sequence[Any] = ()
+
+# Columns of the tasks table needed for the columns of "mq list":
+LIST_COLUMNS = {'i': ['id'],
+                'f': ['folder'],
+                'n': ['name'],
+                'a': ['cmd'],
+                'I': ['restart', 'deps', 'cmd', 'notifications'],
+                'r': ['cores', 'processes', 'tmax', 'nodename', 'weight'],
+                'A': ['tqueued'],
+                's': ['state'],
+                't': ['state', 'trunning', 'tstop'],
+                'e': ['error']}
+
+# ... and for sorting (see Task.order_key()):
+SORT_COLUMNS = {'i': ['id'],
+                'f': ['folder'],
+                'n': ['name', 'id'],
+                'A': ['cmd'],
+                'r': ['cores', 'processes', 'tmax', 'nodename', 'weight'],
+                'a': ['tqueued'],
+                's': ['state'],
+                't': ['state', 'trunning', 'tstop'],
+                'e': ['error']}
+
 
 class Task:
     """Task object.
@@ -41,15 +69,20 @@ class Task:
         Name of files created by task.
     """
 
+    __slots__ = ('cmd', 'resources', 'deps', 'restart', 'workflow',
+                 'folder', 'notifications', 'creates', 'state', 'id',
+                 'error', 'tqueued', 'trunning', 'tstop', 'user',
+                 'script_commands', 'dname', 'dtasks', '_done', 'result')
+
     def __init__(self,
                  cmd: Command,
                  *,
                  resources: Resources,
-                 deps: list[Path],
+                 deps: Sequence[Path],
                  restart: int,
                  workflow: bool,
                  folder: Path,
-                 creates: list[str],
+                 creates: Sequence[str],
                  notifications: str = '',
                  state: State = State.undefined,
                  id: int = 0,
@@ -58,7 +91,7 @@ class Task:
                  trunning: float = 0.0,
                  tstop: float = 0.0,
                  user: str = '',
-                 script_commands: list[str] = [],):
+                 script_commands: Sequence[str] = EMPTY,):
 
         self.cmd = cmd
         self.resources = resources
@@ -79,11 +112,11 @@ class Task:
         self.trunning = trunning
         self.tstop = tstop
 
-        self.user = user or os.environ.get('USER', 'root')
+        self.user = sys.intern(user or os.environ.get('USER', 'root'))
         self.script_commands = script_commands
 
         self.dname = folder / cmd.name
-        self.dtasks: list[Task] = []
+        self.dtasks: Sequence[Task] = EMPTY
         self._done: bool | None = None
         self.result = UNSPECIFIED
 
@@ -92,40 +125,59 @@ class Task:
         return f'{self.cmd.name}.{self.id}'
 
     def running_time(self, t: float = None) -> float:
-        if self.state in ['CANCELED', 'queued', 'hold']:
+        state = self.state
+        if state is State.CANCELED or state is State.queued or \
+           state is State.hold:
             dt = 0.0
-        elif self.state == 'running':
+        elif state is State.running:
             t = t or time.time()
             dt = t - self.trunning
         else:
             dt = self.tstop - self.trunning
         return dt
 
-    def words(self) -> list[str]:
+    def words(self, columns: str = 'ifnaIrAste') -> list[str]:
+        """Text for the columns of a line in the output of "mq list".
+
+        Only the attributes needed for the given columns are used
+        (see :data:`LIST_COLUMNS`).
+        """
         t = time.time()
-        age = t - self.tqueued
-        dt = self.running_time(t)
-
-        info = []
-        if self.restart:
-            info.append(f'*{self.restart}')
-        if self.deps:
-            info.append(f'd{len(self.deps)}')
-        if self.cmd.args:
-            info.append(f'+{len(self.cmd.args)}')
-        if self.notifications:
-            info.append(self.notifications)
-
-        return [str(self.id),
-                str(self.folder) + '/',
-                self.cmd.name.split('+', 1)[0],
-                ' '.join(self.cmd.args),
-                ','.join(info),
-                str(self.resources),
-                seconds_to_time_string(age),
-                self.state.name,
-                seconds_to_time_string(dt),
-                self.error]
+        words = []
+        for c in columns:
+            if c == 'i':
+                word = str(self.id)
+            elif c == 'f':
+                word = str(self.folder) + '/'
+            elif c == 'n':
+                word = self.dname.name.split('+', 1)[0]
+            elif c == 'a':
+                word = ' '.join(self.cmd.args)
+            elif c == 'I':
+                info = []
+                if self.restart:
+                    info.append(f'*{self.restart}')
+                if self.deps:
+                    info.append(f'd{len(self.deps)}')
+                if self.cmd.args:
+                    info.append(f'+{len(self.cmd.args)}')
+                if self.notifications:
+                    info.append(self.notifications)
+                word = ','.join(info)
+            elif c == 'r':
+                word = str(self.resources)
+            elif c == 'A':
+                word = seconds_to_time_string(t - self.tqueued)
+            elif c == 's':
+                word = self.state.name
+            elif c == 't':
+                word = seconds_to_time_string(self.running_time(t))
+            elif c == 'e':
+                word = self.error
+            else:
+                raise ValueError(f'Unknown column: {c}!')
+            words.append(word)
+        return words
 
     def __str__(self) -> str:
         return ' '.join(self.words())
@@ -172,18 +224,19 @@ class Task:
             'workflow': self.workflow,
             'deps': [str(dep) for dep in deps],
             'notifications': self.notifications,
-            'creates': self.creates,
+            'creates': list(self.creates),
             'tqueued': self.tqueued,
             'trunning': self.trunning,
             'tstop': self.tstop,
             'error': self.error,
             'user': self.user,
-            'script_commands': self.script_commands,
+            'script_commands': list(self.script_commands),
             }
 
     def to_sql(self,
                root: Path) -> tuple[int, str, str, str, str,
-                                    str, int, bool, str, float,
+                                    int, int, int, str,
+                                    int, bool, str, float,
                                     str, str, float, float, float,
                                     str, str, str]:
         folder = str(self.folder.relative_to(root))
@@ -197,7 +250,10 @@ class Task:
                 # str(self.dname.relative_to(root)),
                 self.dname.name,
                 json.dumps(self.cmd.todict()),
-                json.dumps(self.resources.todict()),
+                self.resources.cores,
+                self.resources.processes,
+                self.resources.tmax,
+                self.resources.nodename,
                 self.restart,
                 self.workflow,
                 ','.join(str(dep.relative_to(root)) for dep in self.deps),
@@ -212,30 +268,36 @@ class Task:
                 '\n'.join(self.script_commands))
 
     @staticmethod
-    def from_sql_row(row: tuple, root: Path) -> Task:
+    def from_sql_row(row: tuple,
+                     root: Path,
+                     paths: dict[str, Path] = None) -> Task:
+        """Create task from row of tasks_view.
+
+        Use a *paths* dict for interning folders (tasks in the same
+        folder will share one Path object).
+        """
         (id, folder, state, name, cmd,
-         resources, restart, workflow, deps, weight,
+         cores, processes, tmax, nodename,
+         restart, workflow, deps, weight,
          notifications, creates, tqueued, trunning, tstop,
          error, user, script_commands) = row
-        resources = Resources(**json.loads(resources))
-        assert resources.weight == weight
         return Task(id=id,
-                    folder=root / folder,
+                    folder=folder_path(root, folder, paths),
                     state=State(state),
                     cmd=create_command(**json.loads(cmd)),
-                    resources=resources,
+                    resources=Resources(cores, nodename, processes, tmax,
+                                        weight),
                     restart=restart,
                     workflow=bool(workflow),
-                    deps=[] if not deps else [root / dep
-                                              for dep in deps.split(',')],
+                    deps=[root / dep for dep in _split(deps)] or EMPTY,
                     notifications=notifications,
-                    creates=[] if not creates else creates.split(','),
+                    creates=_split(creates),
                     tqueued=tqueued,
                     trunning=trunning,
                     tstop=tstop,
                     error=error,
                     user=user,
-                    script_commands=[] if not script_commands else script_commands.split('\n'))
+                    script_commands=_split(script_commands, '\n'))
 
     @staticmethod
     def fromdict(dct: dict[str, Any], root: Path) -> Task:
@@ -268,7 +330,7 @@ class Task:
                     resources=Resources(**dct.pop('resources')),
                     state=State[dct.pop('state')],
                     folder=folder,
-                    deps=deps,
+                    deps=deps or EMPTY,
                     notifications=dct.pop('notifications', ''),
                     id=id,
                     **dct)
@@ -332,6 +394,85 @@ class Task:
         self.result = self.cmd.run()
 
 
+class LazyTask(Task):
+    """Task created from some of the columns of a row in the tasks table.
+
+    Attributes are converted from the SQL values when they are first
+    used, so that listing a few columns doesn't have to decode JSON and
+    create Path objects for all of them.  Using an attribute that needs a
+    column that wasn't selected will raise a KeyError.
+    """
+    def __init__(self,
+                 row: dict[str, Any],
+                 root: Path,
+                 paths: dict[str, Path] = None):
+        self.row = row
+        self.root = root
+        self.paths = paths
+        self.dtasks = EMPTY
+        self._done = None
+        self.result = UNSPECIFIED
+
+    @property
+    def name(self) -> str:
+        return f'{self.row["name"]}.{self.id}'
+
+    def __getattr__(self, attr: str) -> Any:
+        if attr not in CONVERTERS:
+            raise AttributeError(attr)
+        value = CONVERTERS[attr](self)
+        setattr(self, attr, value)
+        return value
+
+
+def folder_path(root: Path,
+                folder: str,
+                paths: dict[str, Path] | None) -> Path:
+    """Path object for folder (shared with other tasks if paths is given).
+
+    >>> paths: dict[str, Path] = {}
+    >>> p1 = folder_path(Path('/home'), './a/', paths)
+    >>> p1
+    PosixPath('/home/a')
+    >>> folder_path(Path('/home'), './a/', paths) is p1
+    True
+    """
+    if paths is None:
+        return root / folder
+    path = paths.get(folder)
+    if path is None:
+        path = root / folder
+        paths[folder] = path
+    return path
+
+
+def _split(text: str, sep: str = ',') -> Sequence[str]:
+    return text.split(sep) if text else EMPTY
+
+
+CONVERTERS: dict[str, Callable[[LazyTask], Any]] = {
+    'id': lambda t: t.row['id'],
+    'folder': lambda t: folder_path(t.root, t.row['folder'], t.paths),
+    'dname': lambda t: t.folder / t.row['name'],
+    'state': lambda t: State(t.row['state']),
+    'cmd': lambda t: create_command(**json.loads(t.row['cmd'])),
+    'resources': lambda t: Resources(t.row['cores'], t.row['nodename'],
+                                     t.row['processes'], t.row['tmax'],
+                                     t.row['weight']),
+    'restart': lambda t: t.row['restart'],
+    'workflow': lambda t: bool(t.row['workflow']),
+    'deps': lambda t: [t.root / dep
+                       for dep in _split(t.row['deps'])] or EMPTY,
+    'notifications': lambda t: t.row['notifications'],
+    'creates': lambda t: _split(t.row['creates']),
+    'tqueued': lambda t: t.row['tqueued'],
+    'trunning': lambda t: t.row['trunning'],
+    'tstop': lambda t: t.row['tstop'],
+    'error': lambda t: t.row['error'],
+    'user': lambda t: t.row['user'],
+    'script_commands': lambda t: _split(t.row['script_commands'], '\n')}
+
+
 def create_task(cmd: str,
                 args: list[str] = [],
                 *,
@@ -399,7 +540,7 @@ def create_task(cmd: str,
 
     path = Path(folder).absolute()
 
-    dpaths = []
+    dpaths: list[Path] = []
     if deps:
         if isinstance(deps, str):
             deps = deps.split(',')
@@ -430,7 +571,7 @@ def create_task(cmd: str,
 
     return Task(command,
                 resources=res,
-                deps=dpaths,
+                deps=dpaths or EMPTY,
                 restart=restart,
                 workflow=workflow,
                 folder=path,
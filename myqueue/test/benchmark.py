@@ -0,0 +1,206 @@
+"""Benchmarks.
+
+Run like this::
+
+    $ python -m myqueue.test.benchmark prune 100000
+    $ python -m myqueue.test.benchmark order 100000
+    $ python -m myqueue.test.benchmark order 100000 1  # networkx version
+    $ python -m myqueue.test.benchmark startup
+    $ python -m myqueue.test.benchmark dispatch 100000
+    $ python -m myqueue.test.benchmark memory 1000000
+    $ python -m myqueue.test.benchmark select 100000
+"""
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import TypeVar
+
+from myqueue.config import Configuration
+from myqueue.queue import Queue
+from myqueue.states import State
+from myqueue.task import Task, create_task
+
+
+def create_tasks(home: Path, n: int) -> list[Task]:
+    """Create n tasks in n // 10 folders."""
+    tasks = []
+    for i in range(n):
+        task = create_task(f'shell:echo+{i % 10}',
+                           folder=str(home / f'f{i // 10}'))
+        task.id = i + 1
+        tasks.append(task)
+    return tasks
+
+
+def prune_benchmark(n: int = 100_000) -> float:
+    """Time prune() of n tasks where half are already in the queue."""
+    from myqueue.workflow import prune
+    with tempfile.TemporaryDirectory() as dir:
+        home = Path(dir)
+        (home / '.myqueue').mkdir()
+        config = Configuration('test', home=home)
+        tasks = create_tasks(home, n)
+        for task in tasks[::2]:
+            task.state = State.done
+        with Queue(config) as queue:
+            queue.add(*tasks[::2])
+            t0 = time.time()
+            ok, done = prune(tasks, queue)
+            t = time.time() - t0
+        assert len(ok) == n // 2, (len(ok), n)
+    return t
+
+
+T = TypeVar('T')
+
+
+def networkx_order(nodes: dict[T, list[T]]) -> list[T]:
+    """The old networkx implementation of submitting.order()."""
+    import networkx as nx  # type: ignore
+    result: list[T] = []
+    g = nx.Graph(nodes)
+    for component in nx.connected_components(g):
+        dg = nx.DiGraph({node: nodes[node]
+                         for node in component
+                         if node in nodes})
+        result += reversed(list(nx.topological_sort(dg)))
+    return result
+
+
+def create_graph(n: int) -> dict[int, list[int]]:
+    """Chains of 10 nodes with a few extra dependencies."""
+    return {i: [i - 1, i - 5] if i % 10 == 9 else
+            [i - 1] if i % 10 else []
+            for i in range(n)}
+
+
+def order_benchmark(n: int = 100_000, networkx: int = 0) -> float:
+    """Time ordering of n nodes."""
+    from myqueue.submitting import order
+    nodes = create_graph(n)
+    t0 = time.time()
+    if networkx:
+        result = networkx_order(nodes)
+    else:
+        result = order(nodes)
+    t = time.time() - t0
+    assert len(result) == n
+    return t
+
+
+def import_times(args: list[str],
+                 folder: Path,
+                 env: dict[str, str] = {}) -> dict[str, int]:
+    """Run "python -X importtime <args>" and get import times.
+
+    Returns dict mapping module names to cumulative import times in
+    micro-seconds.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', *args],
+                            cwd=folder,
+                            env={**os.environ,
+                                 'MYQUEUE_TESTING': str(folder),
+                                 **env},
+                            capture_output=True,
+                            text=True)
+    assert result.returncode == 0, result.stderr
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and 'cumulative' not in line:
+            _, t, name = line[12:].split('|')
+            times[name.strip()] = int(t)
+    return times
+
+
+def startup_benchmark(repeat: int = 5) -> float:
+    """Best wall-clock time for "mq ls --count" on an empty queue."""
+    with tempfile.TemporaryDirectory() as dir:
+        home = Path(dir)
+        (home / '.myqueue').mkdir()
+        (home / '.myqueue/config.py').write_text(
+            "config = {'scheduler': 'local'}\n")
+        env = {**os.environ, 'MYQUEUE_TESTING': dir}
+        times = []
+        for _ in range(repeat):
+            t0 = time.time()
+            subprocess.run([sys.executable, '-m', 'myqueue', 'ls', '--count'],
+                           cwd=home, env=env, check=True)
+            times.append(time.time() - t0)
+    return min(times)
+
+
+def dispatch_benchmark(n: int = 100_000) -> float:
+    """Time submitting and dispatching n tasks in the local scheduler.
+
+    Tasks are run 4 at a time (no subprocesses are started).
+    """
+    from myqueue.schedulers.local import Server
+    with tempfile.TemporaryDirectory() as dir:
+        home = Path(dir)
+        (home / '.myqueue').mkdir()
+        config = Configuration('local', home=home)
+        tasks = create_tasks(home, n)
+        for task, deps in zip(tasks, create_graph(n).values()):
+            task.dtasks = [tasks[i] for i in deps]
+        server = Server(config, cores=4)
+        t0 = time.time()
+        server.do_submit_many(tasks)
+        running: list[Task] = []
+        while True:
+            while (job := server.next_task()) is not None:
+                running.append(job)
+            if not running:
+                break
+            server.finish(running.pop(0), 0)
+        t = time.time() - t0
+        assert len(server.finished) == n
+    return t
+
+
+def memory_benchmark(n: int = 1_000_000) -> float:
+    """Memory in MB used by n tasks collected from a workflow function."""
+    from myqueue.workflow import collect, run
+
+    def workflow() -> None:
+        for i in range(n):
+            run(shell='echo', args=[i % 10], folder=f'f{i // 10}')
+
+    tracemalloc.start()
+    tasks = collect(workflow, Path('workflow.py'))
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(tasks) == n
+    return memory / 1e6
+
+
+def select_benchmark(n: int = 100_000) -> float:
+    """Time selecting tasks recursively from every tenth of n // 10 folders."""
+    from myqueue.selection import Selection
+    with tempfile.TemporaryDirectory() as dir:
+        home = Path(dir)
+        (home / '.myqueue').mkdir()
+        config = Configuration('test', home=home)
+        folders = [home / f'f{i}' for i in range(0, n // 10, 10)]
+        with Queue(config) as queue:
+            queue.add(*create_tasks(home, n))
+            t0 = time.time()
+            tasks = queue.select(Selection(folders=folders))
+            t = time.time() - t0
+        assert len(tasks) == n // 10
+    return t
+
+
+UNITS = {'memory': 'MB'}
+
+
+if __name__ == '__main__':
+    name, *args = sys.argv[1:]
+    func = globals()[f'{name}_benchmark']
+    t = func(*(int(arg) for arg in args))
+    print(f'{name}: {t:.3f} {UNITS.get(name, "seconds")}')
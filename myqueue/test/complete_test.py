@@ -57,3 +57,19 @@ def test_read(tmp_path):
     assert words == ['abc123']
     words = complete('', '-i', 'mq ls -i ', 9)
     assert words == {'117'}
+
+
+def test_cache(tmp_path, monkeypatch):
+    import sqlite3
+    test_read(tmp_path)
+    assert (tmp_path / '.myqueue/completion.json').is_file()
+    # Cached:
+    with monkeypatch.context() as m:
+        m.setattr(sqlite3, 'connect', None)
+        assert complete('', '-n', 'mq ls -n ', 9) == ['abc123']
+    # New task invalidates cache:
+    task = create_task('xyz')
+    task.id = 118
+    with Queue() as queue:
+        queue.add(task)
+    assert complete('', '-i', 'mq ls -i ', 9) == {'117', '118'}
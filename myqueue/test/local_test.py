@@ -97,3 +97,97 @@ def test_local_scheduler3(scheduler):
     names = set(path.name[6:]
                 for path in Path('.myqueue').glob('local-*-?'))
     assert names == set(['1-2', '3-2', '3-0', '1-0'])
+
+
+def test_port_file_and_cancel_running(scheduler):
+    scheduler, config = scheduler
+    assert (config.home / '.myqueue/local.port').read_text() == '39998\n'
+    other = LocalScheduler(config)  # will find port in local.port file
+    id = other.submit(create_task('shell:sleep+10'))
+    for state in [0, 4]:  # running, CANCELED
+        for i in range(50):
+            if (config.home / f'.myqueue/local-{id}-{state}').is_file():
+                break
+            time.sleep(0.1)
+        else:  # no break
+            1 / 0
+        if state == 0:
+            other.cancel(id)
+
+
+def test_submit_concurrently(scheduler):
+    """Threads share one connection without mixing up replies."""
+    scheduler, config = scheduler
+    config.submission_workers = 4
+    # 25 levels of 4 independent tasks:
+    tasks = [create_task(f'shell:echo+{i}') for i in range(100)]
+    for i in range(4, 100):
+        tasks[i].dtasks = [tasks[i - 4]]
+    ids, ex = submit_tasks(scheduler, tasks, verbosity=0, dry_run=False)
+    assert ex is None
+    assert sorted(ids) == list(range(1, 101))
+    assert [task.id for task in tasks] == ids
+    for i in range(50):
+        if not scheduler.get_ids():
+            break
+        time.sleep(0.1)
+    else:  # no break
+        1 / 0
+    assert len(list(Path('.myqueue').glob('local-*-1'))) == 100
+
+
+def test_unix_socket_and_batch(tmpdir):
+    home = Path(tmpdir)
+    (home / '.myqueue').mkdir()
+    config = Configuration('local', home=home)
+    server = Server(config, cores=2, unix=True)
+    thread = threading.Thread(target=server.run)
+    thread.start()
+    for i in range(50):
+        if (home / '.myqueue/local.sock').is_socket():
+            break
+        time.sleep(0.1)
+    scheduler = LocalScheduler(config)
+    scheduler.port = -1  # make sure we don't use TCP
+    tasks = [create_task(f'shell:echo+{i}', folder=str(home))
+             for i in range(100)]
+    for task in tasks[1:]:
+        task.dtasks = [tasks[0]]
+    assert list(scheduler.submit_many(tasks)) == list(range(1, 101))
+    other = LocalScheduler(config)
+    for i in range(50):
+        if not other.get_ids():
+            break
+        time.sleep(0.1)
+    else:  # no break
+        1 / 0
+    scheduler.send('stop')
+    thread.join()
+    assert not (home / '.myqueue/local.sock').exists()
+    assert len(list(home.glob('.myqueue/local-*-1'))) == 100
+
+
+def test_dispatch_order(tmpdir):
+    home = Path(tmpdir)
+    (home / '.myqueue').mkdir()
+    config = Configuration('local', home=home)
+    server = Server(config, cores=2)
+    a, b, c, d, e = (create_task(f'shell:echo+{x}', folder=str(home),
+                                 cores=cores)
+                     for x, cores in zip('abcde', [1, 2, 1, 1, 1]))
+    c.dtasks = [a]
+    d.dtasks = [c]
+    assert server.do_submit_many([a, b, c, d, e]) == [1, 2, 3, 4, 5]
+    assert server.next_task() is a
+    # b needs 2 cores, so e is started instead:
+    assert server.next_task() is e
+    assert server.next_task() is None
+    server.finish(a, 0)
+    assert server.next_task() is c
+    server.finish(e, 0)
+    server.finish(c, 1)  # d will be canceled
+    assert server.finished[4] == 'CANCELED'
+    assert server.next_task() is b
+    server.finish(b, 0)
+    assert server.next_task() is None
+    assert server.do_list() == []
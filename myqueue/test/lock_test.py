@@ -1,4 +1,7 @@
 from __future__ import annotations
+import os
+import socket
+
 import pytest
 from myqueue.utils import Lock
 
@@ -9,4 +12,53 @@ def test_lock(tmp_path):
         with pytest.raises(TimeoutError):
             with Lock(lockfile, timeout=0.07):
                 pass
-    assert not lockfile.is_file()
+        assert not Lock(lockfile).acquire(blocking=False)
+    assert lockfile.read_text() == f'{socket.gethostname()}:{os.getpid()}\n'
+
+
+def test_lock_without_flock(tmp_path, monkeypatch):
+    import errno
+    import fcntl
+
+    def flock(fd, operation):
+        raise OSError(errno.ENOSYS, 'Function not implemented')
+
+    monkeypatch.setattr(fcntl, 'flock', flock)
+    lockfile = tmp_path / 'lock'
+    with Lock(lockfile):
+        excl = tmp_path / 'lock.excl'
+        assert excl.read_text() == f'{socket.gethostname()}:{os.getpid()}\n'
+        with pytest.raises(TimeoutError):
+            with Lock(lockfile, timeout=0.07):
+                pass
+        assert not Lock(lockfile).acquire(blocking=False)
+    assert not excl.exists()
+    lock = Lock(lockfile)
+    assert lock.acquire(blocking=False)
+    lock.release()
+
+
+def test_stale_lock_without_flock(tmp_path, monkeypatch):
+    import errno
+    import fcntl
+    import subprocess
+    import sys
+
+    def flock(fd, operation):
+        raise OSError(errno.ENOSYS, 'Function not implemented')
+
+    monkeypatch.setattr(fcntl, 'flock', flock)
+    lockfile = tmp_path / 'lock'
+    excl = tmp_path / 'lock.excl'
+    dead = subprocess.run(
+        [sys.executable, '-c', 'import os; print(os.getpid())'],
+        capture_output=True, text=True).stdout.strip()
+    # Lock from crashed process on this host:
+    excl.write_text(f'{socket.gethostname()}:{dead}\n')
+    with Lock(lockfile, timeout=1.0):
+        assert excl.read_text() == f'{socket.gethostname()}:{os.getpid()}\n'
+    # Lock from other host:
+    excl.write_text(f'other-host:{dead}\n')
+    with pytest.raises(TimeoutError):
+        with Lock(lockfile, timeout=0.07):
+            pass
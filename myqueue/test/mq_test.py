@@ -234,3 +234,73 @@ def test_mq_exception(mq):
     with pytest.raises(ValueError):
         mq('ls -i 0 .')
     mq('rm .', error=1)
+
+
+def test_submit_concurrently(mq):
+    from myqueue.submitting import submit
+    mq.config.submission_workers = 3
+    tasks = [task(f'shell:echo+{i}') for i in range(6)]
+    tasks.append(task('shell:echo+7', deps=tasks[:3]))
+    tasks.append(task('shell:echo+8', deps=[tasks[-1]]))
+    with Queue(mq.config) as q:
+        submit(q, tasks)
+    assert mq.wait() == 'd' * 8
+
+    tasks = [task(f'shell:echo+x{i}') for i in range(6)]
+    tasks[1].cmd.args = ['FAIL']
+    with Queue(mq.config) as q:
+        with pytest.raises(RuntimeError):
+            submit(q, tasks)
+    # First chunk: x0 submitted, x1 failed.  Chunks 2 and 3 canceled:
+    assert mq.states() == 'd' * 8 + 'q'
+    assert len(mq.scheduler.tasks) == 1
+
+
+def test_list_sort_and_limit(mq, capsys):
+    for i in range(5):
+        mq(f'submit shell:echo+{i}')
+    capsys.readouterr()
+    mq('ls -c i -S i- --limit 2 --offset 1')
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.strip() for line in lines[3:-2]] == ['4', '3']
+    mq('ls -c i -S A --limit 2')
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.strip() for line in lines[3:-2]] == ['1', '2']
+
+
+def test_archive(mq, capsys):
+    from myqueue.archive import archive_old_tasks
+    from myqueue.workflow import prune
+    mq('submit shell:echo+hello')
+    mq('submit time@sleep+a')
+    mq('submit shell:echo+hi')
+    assert mq.wait() == 'dFd'
+    mq('archive -s a . --older-than 1d')
+    assert mq.states() == 'dFd'
+    capsys.readouterr()
+    mq('archive -i 1,2')
+    assert mq.states() == 'd'
+    assert capsys.readouterr().out.endswith('2 tasks archived\n')
+    mq('ls -c i --archived')
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.strip() for line in lines[3:-2]] == ['1', '2']
+
+    # Archived done tasks are still done:
+    mq('submit shell:echo+bye -d shell:echo+hello')
+    assert mq.wait() == 'dd'
+
+    # ... and archived failed tasks are still failed:
+    capsys.readouterr()
+    mq('submit shell:echo+x -d time@sleep+a')
+    assert 'Skipping 1 task' in capsys.readouterr().out
+    assert mq.states() == 'dd'
+
+    with Queue(mq.config) as q:
+        t1, t2 = task('shell:echo+hello'), task('time@sleep+a')
+        ok, done = prune([t1, t2], q)
+        assert ok == [t2] and done == [t1]
+
+        q.config.archive_policy = {'d': '0s'}
+        assert archive_old_tasks(q) == {'archived': 2}
+        assert q.count(archived=True) == {'done': 3, 'FAILED': 1}
+        assert q.select() == []
@@ -1,4 +1,4 @@
-from myqueue.pretty import pprint
+from myqueue.pretty import pprint, pprint_stream
 from myqueue.task import create_task
 import pytest
 
@@ -8,3 +8,46 @@ def test_pretty(capsys):
     pprint([create_task('abc')] * 10, maxlines=4, columns='i-')
     lines = capsys.readouterr().out.splitlines()
     assert len(lines) == 9
+
+
+def test_stream(capsys):
+    tasks = []
+    for i in range(10):
+        task = create_task(f'abc+{"x" * i}')
+        task.id = i + 1
+        tasks.append(task)
+    pprint_stream(iter(tasks), maxlines=6, columns='ins', sample=3)
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 2 + 3 + 1 + 1 + 2
+    assert lines[5].startswith('... (6 tasks not shown)')
+    assert lines[-1] == 'undefined: 10, total: 10'
+    # Fewer tasks than the sample size:
+    pprint_stream(tasks[:2], columns='ins', sample=3)
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 2 + 2 + 2
+
+
+def test_stream_narrow_columns(capsys):
+    tasks = []
+    for i in range(6):
+        task = create_task('a' if i < 3 else 'abcdefghij')
+        task.id = i + 1
+        tasks.append(task)
+    pprint_stream(tasks, verbosity=0, columns='in', sample=3)
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split()[1] for line in lines] == ['a'] * 3 + ['ab…j'] * 3
+
+
+def test_stream_empty_columns(capsys):
+    """Same columns as pprint() no matter how many tasks."""
+    tasks = []
+    for i in range(4):
+        task = create_task('abc')
+        task.id = i + 1
+        tasks.append(task)
+    pprint_stream(tasks[:2], columns='inI', sample=3)
+    lines1 = capsys.readouterr().out.splitlines()
+    pprint_stream(tasks, columns='inI', sample=3)
+    lines2 = capsys.readouterr().out.splitlines()
+    assert lines1[:2] == lines2[:2]
+    assert 'info' not in lines2[0]
@@ -1,6 +1,8 @@
 import os
+import sqlite3
 
 from myqueue.queue import Queue
+from myqueue.states import State
 
 
 def test_no_such_task(tmp_path):
@@ -10,4 +12,171 @@ def test_no_such_task(tmp_path):
     p = mq / 'test-42-2'
     p.write_text('')
     with Queue() as q:
-        q.connection  # this will trigger q.update_one_task()
+        q.connection  # this will trigger q.update_tasks()
+
+
+def test_update_tasks(mq):
+    from myqueue.task import create_task
+    folder = mq.config.home / '.myqueue'
+    t1 = create_task('shell:echo+1')
+    t2 = create_task('shell:echo+2')
+    t3 = create_task('shell:echo+3')
+    t1.id, t2.id, t3.id = 1, 2, 3
+    t3.dtasks = [t2]
+    with Queue(mq.config) as q:
+        q.add(t1, t2, t3)
+    for name in ['test-1-0', 'test-1-1', 'test-2-0', 'test-2-2']:
+        (folder / name).write_text('')
+    with Queue(mq.config) as q:
+        assert [t.state.value for t in q.select()] == ['d', 'F', 'C']
+        t1, t2, t3 = q.select()
+        assert t1.trunning > 0 and t1.tstop > 0
+    assert not list(folder.glob('test-*'))
+
+
+def test_event_log(mq):
+    from myqueue.events import RECORD_SIZE, write_event
+    from myqueue.task import create_task
+    mq.config.event_log = True
+    folder = mq.config.home / '.myqueue'
+    t1 = create_task('shell:echo+1')
+    t2 = create_task('shell:echo+2')
+    t1.id, t2.id = 1, 2
+    with Queue(mq.config) as q:
+        q.add(t1, t2)
+    write_event(folder / 'events', 1, 0)
+    (folder / 'test-2-0').write_text('')  # old protocol
+    [log] = (folder / 'events').glob('*.log')
+    with log.open('ab') as fd:
+        fd.write(b'1 ')  # incomplete record
+    with Queue(mq.config) as q:
+        assert [t.state.value for t in q.select()] == ['r', 'r']
+    with log.open('r+b') as fd:
+        fd.seek(RECORD_SIZE)
+        fd.truncate()
+    write_event(folder / 'events', 1, 1)
+    with Queue(mq.config) as q:
+        assert [t.state.value for t in q.select()] == ['d', 'r']
+        [(offset,)] = q.sql('SELECT value FROM meta WHERE key GLOB "events:*"')
+    assert int(offset) == 2 * RECORD_SIZE
+
+
+def test_event_log_bad_record(mq):
+    """A partial record in the middle of a log is skipped."""
+    import pytest
+    from myqueue.events import write_event
+    from myqueue.task import create_task
+    mq.config.event_log = True
+    folder = mq.config.home / '.myqueue'
+    t1 = create_task('shell:echo+1')
+    t1.id = 1
+    with Queue(mq.config) as q:
+        q.add(t1)
+    write_event(folder / 'events', 1, 0)
+    [log] = (folder / 'events').glob('*.log')
+    with log.open('ab') as fd:
+        fd.write(b'1 1 123.4\n')  # killed while writing
+    write_event(folder / 'events', 1, 1)
+    with pytest.warns(UserWarning, match='bad record'):
+        with Queue(mq.config) as q:
+            assert [t.state.value for t in q.select()] == ['d']
+
+
+def test_update_many_tasks(mq):
+    """Older SQLite versions allow only 999 variables in a statement."""
+    import pytest
+    from myqueue.task import create_task
+    if not hasattr(sqlite3, 'SQLITE_LIMIT_VARIABLE_NUMBER'):
+        pytest.skip('Needs Python 3.11')
+    tasks = [create_task(f'shell:echo+{i}') for i in range(1500)]
+    for id, task in enumerate(tasks, start=1):
+        task.id = id
+    with Queue(mq.config) as q:
+        q.add(*tasks)
+        q.connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        q.update_tasks([(1.0, id, 1, None) for id in range(1, 1501)])
+        assert q.count() == {'done': 1500}
+
+
+def test_find_dependents(mq):
+    """Long chain and diamond."""
+    from myqueue.task import create_task
+    n = 5000
+    tasks = [create_task(f'shell:echo+{i}') for i in range(n + 2)]
+    for i, task in enumerate(tasks):
+        task.id = i + 1
+        if 0 < i < n:
+            task.dtasks = [tasks[i - 1]]
+    tasks[n].dtasks = [tasks[0]]
+    tasks[n + 1].dtasks = [tasks[n - 1], tasks[n]]
+    with Queue(mq.config) as q:
+        q.add(*tasks)
+        ids = list(q.find_dependents([1]))
+        assert sorted(ids) == list(range(2, n + 3))
+        if hasattr(sqlite3, 'SQLITE_LIMIT_VARIABLE_NUMBER'):
+            # Older SQLite versions allow only 999 variables:
+            q.connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        ids = list(q.find_dependents(range(1, n)))
+        assert sorted(ids) == list(range(2, n + 3))
+        q.cancel_dependents([n - 2])
+        states = ''.join(t.state.value for t in q.select())
+        assert states[-5:] == 'uCCuC'
+
+
+def test_lazy_tasks(mq):
+    from myqueue.pretty import sql_columns
+    from myqueue.task import LazyTask, create_task
+    t1 = create_task('shell:echo+1', folder=mq.config.home)
+    t2 = create_task('shell:echo+2', folder=mq.config.home)
+    t1.id, t2.id = 1, 2
+    t2.state = State.done
+    with Queue(mq.config) as q:
+        q.add(t1, t2)
+        columns = sql_columns('is')
+        assert columns == ['state', 'id']
+        tasks = q.select(columns=columns)
+        assert all(isinstance(task, LazyTask) for task in tasks)
+        assert sorted(task.words('is') for task in tasks) == [
+            ['1', 'undefined'],
+            ['2', 'done']]
+        [task] = q.tasks('id = 2', columns=['id', 'folder', 'name', 'cmd'])
+        assert task.dname == t2.dname
+        assert task.cmd.args == ['2']
+        assert q.count() == {'undefined': 1, 'done': 1}
+
+
+def test_find_ids_and_states(mq):
+    from myqueue.task import create_task
+    t1 = create_task('shell:echo+1', folder=mq.config.home)
+    t2 = create_task('shell:echo+1', folder=mq.config.home)
+    t1.id, t2.id = 1, 2
+    t2.state = State.FAILED
+    with Queue(mq.config) as q:
+        q.add(t1, t2)
+        found = q.find_ids_and_states([('./', 'shell:echo+1'),
+                                       ('./', 'shell:echo+1'),
+                                       ('./a/', 'shell:echo+1')])
+        assert found == {('./', 'shell:echo+1'): (2, 'F')}
+
+
+def test_select_folders(mq):
+    from myqueue.selection import Selection
+    from myqueue.task import create_task
+    home = mq.config.home
+    names = ['a', 'a/b', 'a0', 'a[1]', 'a[1]/c', 'b', 'ab']
+    tasks = [create_task('shell:echo', folder=home / name) for name in names]
+    for id, task in enumerate(tasks, start=1):
+        task.id = id
+    with Queue(mq.config) as q:
+        q.add(*tasks)
+
+        def ids(*folders, recursive=True):
+            selection = Selection(folders=[home / f for f in folders],
+                                  recursive=recursive)
+            return sorted(task.id for task in q.select(selection))
+
+        assert ids('a') == [1, 2]
+        assert ids('a[1]') == [4, 5]
+        assert ids('a', 'a/b', 'b') == [1, 2, 6]
+        assert ids('a', 'b', recursive=False) == [1, 6]
+        assert ids('.') == list(range(1, 8))
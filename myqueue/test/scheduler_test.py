@@ -76,3 +76,69 @@ def test_scheduler_subprocess(monkeypatch, name):
     t = create_task('FAIL', resources='2:1h')
     with pytest.raises(SchedulerError, match='FAIL'):
         scheduler.submit(t)
+
+
+def test_slurm_job_array(monkeypatch):
+    from myqueue.config import Configuration
+    from myqueue.schedulers.slurm import SLURM, array_task_id
+
+    commands = []
+
+    def run2(cmd, **kwargs):
+        commands.append(cmd)
+        return run(cmd, **kwargs)
+
+    monkeypatch.setattr(subprocess, 'run', run2)
+
+    config = Configuration('slurm')
+    config.nodes = [('abc16', {'cores': 16, 'memory': '16G'})]
+    scheduler = SLURM(config)
+    t1, t2, t3 = (create_task(f'shell:echo+{i}', resources='2:1h')
+                  for i in range(3))
+    t4 = create_task('shell:echo+4', resources='4:1h')
+    t3.dtasks = [t1]
+    tasks = [t1, t2, t3, t4]
+    ids = []
+    for task, id in zip(tasks, scheduler.submit_many(tasks)):
+        task.id = id
+        ids.append(id)
+    assert ids == [array_task_id(42, 0), array_task_id(42, 1), 42, 42]
+    assert len(commands) == 3
+    assert '--array=0-1' in commands[0]
+    assert '--dependency=afterok:42_0' in commands[1]
+
+    scheduler.cancel(ids[1])
+    assert commands[-1] == ['scancel', '42_1']
+
+
+def test_slurm_job_array_quoting(monkeypatch, tmp_path):
+    from myqueue.config import Configuration
+    from myqueue.schedulers.slurm import SLURM
+
+    real_run = subprocess.run
+    scripts = []
+
+    def run2(cmd, **kwargs):
+        scripts.append(kwargs['input'].decode())
+        return run(cmd, **kwargs)
+
+    monkeypatch.setattr(subprocess, 'run', run2)
+
+    folder = tmp_path / "it's $HOME"
+    folder.mkdir()
+    config = Configuration('slurm')
+    config.nodes = [('abc16', {'cores': 16, 'memory': '16G'})]
+    scheduler = SLURM(config)
+    tasks = [create_task(f'shell:echo+{i}', resources='2:1h',
+                         folder=str(folder))
+             for i in range(2)]
+    list(scheduler.submit_many(tasks))
+    lines = [line for line in scripts[0].splitlines()
+             if line.startswith(' cd ')]
+    assert len(lines) == 2
+    for line in lines:
+        assert line.endswith(' && \\')
+        # Let bash do the cd:
+        result = real_run(['bash', '-c', line[:-5] + ' && pwd'],
+                          capture_output=True, text=True)
+        assert result.stdout == f'{folder}\n'
@@ -1,5 +1,6 @@
 import json
 import os
+import sqlite3
 
 from myqueue.queue import Queue, dump_db
 from myqueue.task import create_task
@@ -17,3 +18,144 @@ def test_migration(tmp_path):
         tasks = q.select()
         assert len(tasks) == 1
     dump_db(mq / 'queue.sqlite3')
+
+
+def test_storage_profile(tmp_path):
+    from myqueue.config import Configuration
+    (tmp_path / '.myqueue').mkdir()
+    # A dry-run doesn't change the file:
+    config = Configuration('test', home=tmp_path, storage_profile='local')
+    with Queue(config, dry_run=True) as q:
+        assert list(q.sql('SELECT value FROM meta '
+                          'WHERE key = "journal_mode"')) == []
+        [(journal_mode,)] = q.sql('PRAGMA journal_mode')
+        assert journal_mode == 'delete'
+    profiles: list[tuple[str | dict[str, str | int], str]] = [
+        ('local', 'WAL'),
+        ('network', 'TRUNCATE'),
+        ({'synchronous': 'OFF'}, 'DELETE')]
+    for profile, mode in profiles:
+        config = Configuration('test', home=tmp_path,
+                               storage_profile=profile)
+        with Queue(config) as q:
+            [(journal_mode,)] = q.sql('PRAGMA journal_mode')
+            assert journal_mode == mode.lower()
+            [(value,)] = q.sql('SELECT value FROM meta '
+                               'WHERE key = "journal_mode"')
+            assert value == mode
+        with Queue(config, need_lock=False) as q:
+            assert len(q.select()) == 0
+
+
+def create_version_11_file(tmp_path):
+    (tmp_path / '.myqueue').mkdir()
+    db = sqlite3.connect(tmp_path / '.myqueue/queue.sqlite3')
+    db.execute(
+        'CREATE TABLE tasks (id INTEGER PRIMARY KEY, folder TEXT, '
+        'state CHARCTER, name TEXT, cmd TEXT, resources TEXT, '
+        'restart INTEGER, workflow INTEGER, deps TEXT, weight REAL, '
+        'notifications TEXT, creates TEXT, tqueued REAL, trunning REAL, '
+        'tstop REAL, error TEXT, user TEXT, script_commands TEXT)')
+    db.execute('CREATE TABLE dependencies (id INTEGER, did INTEGER)')
+    db.execute('CREATE TABLE meta (key TEXT, value TEXT)')
+    db.execute('CREATE INDEX folder_index on tasks(folder)')
+    db.execute('INSERT INTO meta VALUES ("version", "11")')
+    cmd = json.dumps(create_task('shell:echo').cmd.todict())
+    for id, resources in [(1, '{"cores": 8}'),
+                          (2, '{"cores": 8, "processes": 1, '
+                           '"tmax": 60, "nodename": "xeon8"}')]:
+        db.execute(
+            'INSERT INTO tasks VALUES '
+            '(?, "./", "d", "echo", ?, ?, 0, 0, "", -1.0, "", "", '
+            '0.0, 0.0, 0.0, "", "me", "")',
+            [id, cmd, resources])
+    db.commit()
+    db.close()
+
+
+def test_upgrade(tmp_path):
+    """Version 11 file gets upgraded to newest version."""
+    from myqueue.config import Configuration
+    create_version_11_file(tmp_path)
+    config = Configuration('test', home=tmp_path)
+    with Queue(config) as q:
+        [(version,)] = q.sql('SELECT value FROM meta WHERE key="version"')
+        assert version == '16'
+        indices = {name for name, in q.sql(
+            'SELECT name FROM sqlite_master WHERE type = "index"')}
+        assert 'folder_name_index' in indices
+        assert 'folder_index' not in indices
+        assert q.get_manifests([('./', 'wf.py')]) == {}
+        t1, t2 = q.select()
+        assert str(t1.resources) == '8:10m'
+        assert str(t2.resources) == '8:1:xeon8:1m'
+        assert [t.id for t in q.tasks('cores = 8 AND tmax < 600')] == [2]
+        assert t1.folder is t2.folder
+        assert list(q.sql('SELECT COUNT(*) FROM folders')) == [(1,)]
+        assert list(q.sql('SELECT COUNT(*) FROM commands')) == [(1,)]
+
+
+def test_read_old_version(tmp_path):
+    """Old file can't be read without upgrading it first."""
+    import pytest
+    from myqueue.config import Configuration
+    from myqueue.queue import OldDatabaseError
+    from myqueue.utils import Lock
+    create_version_11_file(tmp_path)
+    config = Configuration('test', home=tmp_path)
+    with Lock(tmp_path / '.myqueue/queue.sqlite3.myqueue.lock'):
+        with Queue(config, need_lock=False) as q:
+            with pytest.raises(OldDatabaseError):
+                q.select()
+    with Queue(config, need_lock=False) as q:
+        assert len(q.select()) == 2
+
+
+def test_folders_and_commands(tmp_path):
+    """Folders and commands are stored once."""
+    from myqueue.config import Configuration
+    (tmp_path / '.myqueue').mkdir()
+    config = Configuration('test', home=tmp_path)
+    tasks = [create_task('shell:echo', folder=str(tmp_path / f))
+             for f in ['a', 'a', 'b']]
+    for id, task in enumerate(tasks, start=1):
+        task.id = id
+    with Queue(config) as q:
+        q.add(*tasks)
+        assert list(q.sql('SELECT COUNT(*) FROM folders')) == [(2,)]
+        assert list(q.sql('SELECT COUNT(*) FROM commands')) == [(1,)]
+        t1, t2, t3 = q.select()
+        assert t1.folder is t2.folder == tmp_path / 'a'
+        assert t3.folder == tmp_path / 'b'
+        assert str(t3.cmd) == 'echo'
+        q.remove([3])
+        assert list(q.sql('SELECT folder FROM folders')) == [('./a/',)]
+        q.remove([1, 2])
+        assert list(q.sql('SELECT COUNT(*) FROM commands')) == [(0,)]
+
+
+def test_interrupted_upgrade(tmp_path, monkeypatch):
+    """A failing upgrade step is rolled back and can be re-run."""
+    import pytest
+    from myqueue.config import Configuration
+    from myqueue.queue import UPGRADES
+    create_version_11_file(tmp_path)
+    config = Configuration('test', home=tmp_path)
+    monkeypatch.setitem(UPGRADES, 13,
+                        UPGRADES[13] + ';\nSELECT * FROM no_such_table')
+    with pytest.raises(sqlite3.OperationalError):
+        with Queue(config) as q:
+            q.connection
+    monkeypatch.undo()
+    db = sqlite3.connect(tmp_path / '.myqueue/queue.sqlite3')
+    [(version,)] = db.execute('SELECT value FROM meta WHERE key="version"')
+    assert version == '13'
+    tables = {name for name, in db.execute(
+        'SELECT name FROM sqlite_master WHERE type = "table"')}
+    assert 'manifests' in tables
+    assert 'new_tasks' not in tables
+    db.close()
+    with Queue(config) as q:
+        [(version,)] = q.sql('SELECT value FROM meta WHERE key="version"')
+        assert version == '16'
+        assert len(q.select()) == 2
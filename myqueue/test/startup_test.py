@@ -0,0 +1,25 @@
+from myqueue.test.benchmark import import_times, startup_benchmark
+
+# Modules that "mq ls" and bash-completion should not need:
+HEAVY = ['rich', 'networkx', 'typing_extensions', 'importlib.metadata',
+         'email', 'myqueue.workflow', 'myqueue.kick', 'myqueue.migration']
+
+
+def test_list_count_imports(tmp_path):
+    (tmp_path / '.myqueue').mkdir()
+    (tmp_path / '.myqueue/config.py').write_text(
+        "config = {'scheduler': 'local'}\n")
+    times = import_times(['-m', 'myqueue', 'ls', '--count'], tmp_path)
+    assert 'myqueue.queue' in times
+    for name in HEAVY:
+        assert name not in times
+    startup_benchmark(repeat=1)
+
+
+def test_completion_imports(tmp_path):
+    (tmp_path / '.myqueue').mkdir()
+    times = import_times(['-m', 'myqueue.complete', 'mq', '', '-n'],
+                         tmp_path,
+                         {'COMP_LINE': 'mq ls -n ', 'COMP_POINT': '9'})
+    for name in HEAVY + ['myqueue.queue', 'myqueue.task']:
+        assert name not in times
@@ -3,7 +3,7 @@ from types import SimpleNamespace
 
 import pytest
 from myqueue.states import State
-from myqueue.task import create_task
+from myqueue.task import EMPTY, create_task
 
 
 def test_task(tmp_path):
@@ -63,3 +63,13 @@ def test_task(tmp_path):
     assert oom()
     err.write_text('... some other error ...')
     assert not oom()
+
+
+def test_shared_empty_lists():
+    """Tasks share one immutable empty sequence."""
+    t1 = create_task('x')
+    t2 = create_task('y')
+    assert t1.deps is t2.deps is t1.dtasks is EMPTY
+    with pytest.raises(AttributeError):
+        t1.deps.append(Path('z'))  # type: ignore
+    assert t1.todict()['deps'] == []
@@ -243,3 +243,108 @@ def test_creates(mq):
     Path('out.txt').write_text('OK\n')
     mq('workflow wf.py')
     assert mq.wait() == 'd'
+
+
+def test_prune_benchmark():
+    from myqueue.test.benchmark import prune_benchmark
+    prune_benchmark(200)
+
+
+wf_jobs = """
+from myqueue.workflow import run
+def workflow():
+    with run(shell='echo', args=['hello']):
+        run(function=print, name='p')
+"""
+
+
+def test_workflow_jobs(mq):
+    from myqueue.workflow import workflow_from_script
+    Path('wf.py').write_text(wf_jobs)
+    folders = [Path(f'f{i}') for i in range(5)]
+    for folder in folders:
+        folder.mkdir()
+    tasks1 = workflow_from_script(Path('wf.py'), {}, folders)
+    tasks2 = workflow_from_script(Path('wf.py'), {}, folders, jobs=2)
+    assert ([(task.dname, task.deps, str(task.cmd)) for task in tasks1] ==
+            [(task.dname, task.deps, str(task.cmd)) for task in tasks2])
+    mq('workflow wf.py f0 f1 f2 f3 f4 --jobs 2')
+    assert mq.wait() == 'dd' * 5
+
+
+def test_compile_script_cache(tmp_path, monkeypatch):
+    from myqueue import workflow as wf
+    monkeypatch.setattr(wf, 'COMPILED_SCRIPTS', {})
+    cache = tmp_path / 'cache'
+    for name in 'ab':
+        (tmp_path / name).mkdir()
+        (tmp_path / name / 'wf.py').write_text(wf_jobs)
+    f1 = wf.get_workflow_function(tmp_path / 'a/wf.py', cache_dir=cache)
+    f2 = wf.get_workflow_function(tmp_path / 'b/wf.py', cache_dir=cache)
+    assert f1 is not f2
+    assert f1.__code__ is f2.__code__
+    assert len(wf.COMPILED_SCRIPTS) == 1
+    [pyc] = cache.glob('*.pyc')
+    # Read from disk:
+    wf.COMPILED_SCRIPTS.clear()
+    f3 = wf.get_workflow_function(tmp_path / 'a/wf.py', cache_dir=cache)
+    assert f3.__code__ == f1.__code__
+    # Corrupt cache file:
+    pyc.write_bytes(b'garbage')
+    wf.COMPILED_SCRIPTS.clear()
+    wf.get_workflow_function(tmp_path / 'a/wf.py', cache_dir=cache)
+    assert pyc.read_bytes() != b'garbage'
+
+
+def test_compile_script_annotations(tmp_path, monkeypatch):
+    """Workflow scripts must not inherit __future__ imports."""
+    from myqueue import workflow as wf
+    monkeypatch.setattr(wf, 'COMPILED_SCRIPTS', {})
+    script = tmp_path / 'wf.py'
+    script.write_text('def workflow(x: int) -> None:\n    pass\n')
+    func = wf.get_workflow_function(script)
+    assert func.__annotations__ == {'x': int, 'return': None}
+
+
+def test_incremental(mq, capsys):
+    Path('wf.py').write_text(wf_jobs)
+    for f in ['f0', 'f1']:
+        Path(f).mkdir()
+    mq('workflow wf.py f0 f1 --incremental')
+    assert mq.wait() == 'dd' * 2
+    mq('workflow wf.py f0 f1 --incremental -j 2')  # states have changed
+    capsys.readouterr()
+    mq('workflow wf.py f0 f1 --incremental')
+    assert 'Skipping 2 unchanged folders' in capsys.readouterr().out
+    # Remove result file:
+    Path('f1/p.result').unlink()
+    mq('workflow wf.py f0 f1 --incremental')
+    assert 'Skipping 1 unchanged folder\n' in capsys.readouterr().out
+    # New script:
+    Path('wf.py').write_text(wf_jobs + '\n')
+    mq('workflow wf.py f0 f1 --incremental')
+    assert 'Skipping' not in capsys.readouterr().out
+    # Archived done tasks are still done:
+    mq('archive -s d . -r')
+    assert mq.states() == ''
+    capsys.readouterr()
+    mq('workflow wf.py f0 f1 --incremental')
+    assert 'Skipping 2 unchanged folders' in capsys.readouterr().out
+
+
+def test_order():
+    from myqueue.submitting import order
+    from myqueue.test.benchmark import create_graph, order_benchmark
+    nodes = create_graph(100)
+    result = order(nodes)
+    # Components come in order and are not mixed:
+    for i in range(0, 100, 10):
+        assert sorted(result[i:i + 10]) == list(range(i, i + 10))
+    nodes[100] = [3, 200]  # depends on node that is not a key
+    result = order(nodes)
+    assert sorted(result) == list(range(101)) + [200]
+    position = {node: i for i, node in enumerate(result)}
+    for node, deps in nodes.items():
+        for dep in deps:
+            assert position[dep] < position[node]
+    order_benchmark(1000)
@@ -2,8 +2,10 @@
 from __future__ import annotations
 
 import errno
+import fcntl
 import os
 import re
+import socket
 import sys
 import time
 from contextlib import contextmanager
@@ -68,32 +70,123 @@ def opencew(filename: str) -> IO[bytes] | None:
         return os.fdopen(fd, 'wb')
 
 
+# flock() errors from filesystems that don't support it:
+NO_FLOCK = {errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOLCK}
+
+
 class Lock:
-    """File lock."""
-    def __init__(self, name: Path, timeout: float = inf):
+    """File lock.
+
+    Uses ``fcntl.flock()``, so a lock held by a process that crashes is
+    released automatically.  The lock-file is never removed.  The owner of
+    the lock writes ``<host>:<pid>`` to the file.
+
+    Some network filesystems (Lustre without flock, some NFS mounts)
+    don't support ``flock()``.  There, the lock is a ``<name>.excl`` file
+    that is created exclusively and removed when the lock is released.
+    If a process crashes and leaves it behind, it is removed by the next
+    process on the same host that finds that the owner is no longer
+    running.
+    """
+    def __init__(self,
+                 name: Path,
+                 timeout: float = inf):
         self.lock = name
         self.timeout = timeout
         self.locked = False
+        self.fd = -1
+        # Lock-file used when flock() is not supported:
+        self.fallback: Path | None = None
 
-    def acquire(self) -> None:
-        """Wait for lock to become available and then acquire it."""
+    def acquire(self, blocking: bool = True) -> bool:
+        """Wait for lock to become available and then acquire it.
+
+        With *blocking=False*, return False immediately if the lock is
+        taken.
+        """
         t = 0.0
         delta = 0.05
-        while True:
-            fd = opencew(str(self.lock))
-            if fd is not None:
-                break
+        while not self._try_acquire():
+            if not blocking or t > self.timeout:
+                if blocking:
+                    raise TimeoutError(self.fallback or self.lock)
+                return False
             time.sleep(delta)
             t += delta
-            if t > self.timeout:
-                raise TimeoutError(self.lock)
-            delta *= 2
+            delta = min(delta * 2, 1.0)
+
+        os.ftruncate(self.fd, 0)
+        os.write(self.fd, f'{socket.gethostname()}:{os.getpid()}\n'.encode())
         self.locked = True
+        return True
+
+    def _try_acquire(self) -> bool:
+        if self.fallback is None:
+            fd = os.open(self.lock, os.O_RDWR | os.O_CREAT, 0o666)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return False
+            except OSError as ex:
+                os.close(fd)
+                if ex.errno not in NO_FLOCK:
+                    raise
+                self.fallback = self.lock.with_name(self.lock.name + '.excl')
+            else:
+                self.fd = fd
+                return True
+        try:
+            self.fd = os.open(self.fallback,
+                              os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+        except FileExistsError:
+            self._break_stale_lock()
+            return False
+        return True
+
+    def _break_stale_lock(self) -> None:
+        """Remove fallback lock-file if its owner is dead.
+
+        Only owners on this host can be checked.
+        """
+        assert self.fallback is not None
+        try:
+            owner = self.fallback.read_text()
+            host, pid = owner.split(':')
+            if host != socket.gethostname():
+                return
+            os.kill(int(pid), 0)
+        except (FileNotFoundError, ValueError, PermissionError):
+            # Gone, not written yet or owned by someone else
+            return
+        except ProcessLookupError:
+            pass
+        else:
+            return  # still running
+        # Another process may have broken the lock and taken it since we
+        # read the file, so we move the file away and check it again:
+        stale = self.fallback.with_name(f'{self.fallback.name}.{os.getpid()}')
+        try:
+            os.rename(self.fallback, stale)
+        except FileNotFoundError:
+            return
+        if stale.read_text() != owner:
+            # Not the stale lock.  Put it back:
+            try:
+                os.link(stale, self.fallback)
+            except FileExistsError:
+                pass
+        stale.unlink()
 
     def release(self) -> None:
         """Release lock."""
         if self.locked:
-            self.lock.unlink()
+            if self.fallback is None:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+            else:
+                self.fallback.unlink()
+            os.close(self.fd)
+            self.fd = -1
             self.locked = False
 
     def __enter__(self) -> 'Lock':
@@ -146,6 +239,20 @@ def normalize_folder(folder: Path, root: Path) -> str:
     return f'./{f}/'
 
 
+def folder_range(folder: str) -> tuple[str, str]:
+    """Half-open range of normalized folders inside folder.
+
+    A normalized folder *f* is inside *folder* (or equal to it) if
+    ``lower <= f < upper``.  This can be done with an index range scan
+    (unlike ``f GLOB 'folder*'``, which also breaks for folder names
+    containing ``*``, ``?`` or ``[``):
+
+    >>> folder_range('./a/b/')
+    ('./a/b/', './a/b0')
+    """
+    return folder, folder[:-1] + chr(ord(folder[-1]) + 1)
+
+
 def update_readme_and_completion(test: bool = False) -> None:
     """Update README.rst and commands dict.
 
@@ -308,7 +415,7 @@ def get_states_of_active_tasks(folder: Path = None) -> dict[str, str]:
     config = Configuration.read(folder)
     with Queue(config, need_lock=False) as queue:
         active = queue.sql(
-            'SELECT folder, name, state FROM tasks '
+            'SELECT folder, name, state FROM tasks_view '
             'WHERE state IN ("q", "h", "r")')
         return {folder + name: state
                 for folder, name, state in active}
@@ -1,22 +1,25 @@
 from __future__ import annotations
 
-import ast
-import runpy
 import argparse
+import ast
+import hashlib
+import marshal
+import os
 from collections import defaultdict
 from functools import partial
 from pathlib import Path
-from types import TracebackType
+from types import CodeType, TracebackType
 from typing import Any, Callable, Sequence, Type, Union
 
 from myqueue.caching import json_cached_function, CacheFileNotFoundError
 from myqueue.cli import MQError
 from myqueue.commands import (Command, PythonModule, PythonScript,
                               ShellCommand, ShellScript, WorkflowTask)
+from myqueue.manifests import Manifests
 from myqueue.resources import Resources
 from myqueue.states import State
-from myqueue.task import UNSPECIFIED, Task
-from myqueue.utils import chdir, normalize_folder
+from myqueue.task import EMPTY, UNSPECIFIED, Task
+from myqueue.utils import chdir, normalize_folder, plural
 from myqueue.queue import Queue
 
 DEFAULT_VERBOSITY = 1
@@ -24,8 +27,15 @@ DEFAULT_VERBOSITY = 1
 
 def workflow(args: argparse.Namespace,
              folders: list[Path],
-             verbosity: int = DEFAULT_VERBOSITY) -> list[Task]:
-    """Collect tasks from workflow script(s) and folders."""
+             verbosity: int = DEFAULT_VERBOSITY,
+             cache_dir: Path | None = None,
+             manifests: Manifests | None = None) -> list[Task]:
+    """Collect tasks from workflow script(s) and folders.
+
+    Compiled scripts are cached in *cache_dir* (if given).  Folders
+    that haven't changed since the last run are skipped if *manifests*
+    is given.
+    """
     if args.arguments:
         kwargs = str2kwargs(args.arguments)
     else:
@@ -36,12 +46,18 @@ def workflow(args: argparse.Namespace,
         tasks = workflow_from_scripts(pattern,
                                       kwargs,
                                       folders,
-                                      verbosity=verbosity)
+                                      verbosity=verbosity,
+                                      jobs=args.jobs,
+                                      cache_dir=cache_dir,
+                                      manifests=manifests)
     else:
         tasks = workflow_from_script(Path(args.script),
                                      kwargs,
                                      folders,
-                                     verbosity=verbosity)
+                                     verbosity=verbosity,
+                                     jobs=args.jobs,
+                                     cache_dir=cache_dir,
+                                     manifests=manifests)
 
     if args.targets:
         names = args.targets.split(',')
@@ -63,24 +79,26 @@ def prune(tasks: Sequence[Task],
     """Only keep tasks that are not already done.
 
     Will also skip tasks in a bad state (unless *force* is True).
-    Done means a task is marked as "done" in the queue or it has created
-    its files.
+    Done means a task is marked as "done" in the queue (or in the archive)
+    or it has created its files.
     """
     root = queue.config.home
     ok: list[Task] = []
     done: list[Task] = []
     remove: list[int] = []
     count: defaultdict[str, int] = defaultdict(int)
-    for task in tasks:
-        # name = str(task.dname.relative_to(root))
-        name = task.dname.name
-        f = normalize_folder(task.folder, root)
-        rows = queue.sql(
-            'SELECT id, state FROM tasks WHERE name = ? AND folder = ?',
-            [name, f])
-        id, state = max(rows, default=(-1, 'u'))
+    keys = [(normalize_folder(task.folder, root), task.dname.name)
+            for task in tasks]
+    found = queue.find_ids_and_states(keys)
+    archived = queue.find_ids_and_states(
+        (key for key in keys if key not in found), archived=True)
+    for task, key in zip(tasks, keys):
+        id, state = found.get(key, (-1, 'u'))
         if id == -1:
-            if task.check_creates_files():
+            if archived.get(key, (-1, 'u'))[1] == 'd':
+                state = 'd'
+                done.append(task)
+            elif task.check_creates_files():
                 state = 'd*'
                 done.append(task)
             else:
@@ -111,10 +129,65 @@ def prune(tasks: Sequence[Task],
 WorkflowFunction = Callable[[], None]
 
 
+# Compiled workflow scripts (the key is a hash of the source code):
+COMPILED_SCRIPTS: dict[str, CodeType] = {}
+
+
+def compile_script(path: Path, cache_dir: Path | None = None) -> CodeType:
+    """Compile script or get compiled code from cache.
+
+    Identical scripts are only compiled once.  The code is cached in
+    memory and (if *cache_dir* is given) as ``<cache_dir>/<hash>.pyc``
+    files.  Copies of a script share the code object compiled for the
+    first one, so tracebacks may show the path of another copy.
+    """
+    import importlib.util
+    source = path.read_bytes()
+    key = hashlib.sha256(source).hexdigest()
+    code = COMPILED_SCRIPTS.get(key)
+    if code is not None:
+        return code
+
+    magic = importlib.util.MAGIC_NUMBER
+    if cache_dir is not None:
+        pyc = cache_dir / f'{key}.pyc'
+        try:
+            data = pyc.read_bytes()
+        except FileNotFoundError:
+            pass
+        else:
+            if data.startswith(magic):
+                try:
+                    code = marshal.loads(data[len(magic):])
+                except (EOFError, ValueError, TypeError):
+                    pass
+
+    if code is None:
+        # Don't let "from __future__ import annotations" from this
+        # module leak into the script:
+        code = compile(source, str(path), 'exec', dont_inherit=True)
+        if cache_dir is not None:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp = pyc.with_name(f'{key}.{os.getpid()}.tmp')
+            tmp.write_bytes(magic + marshal.dumps(code))
+            tmp.replace(pyc)
+
+    COMPILED_SCRIPTS[key] = code
+    return code
+
+
 def get_workflow_function(path: Path,
-                          kwargs: dict[str, Any] = {}) -> WorkflowFunction:
+                          kwargs: dict[str, Any] = {},
+                          cache_dir: Path | None = None) -> WorkflowFunction:
     """Get workflow function from script."""
-    module = runpy.run_path(str(path))  # type: ignore # bug in typeshed?
+    module: dict[str, Any] = {'__name__': '<run_path>',
+                              '__file__': str(path),
+                              '__cached__': None,
+                              '__doc__': None,
+                              '__loader__': None,
+                              '__package__': None,
+                              '__spec__': None}
+    exec(compile_script(path, cache_dir), module)
     try:
         func = module['workflow']
     except KeyError:
@@ -130,49 +203,127 @@ def workflow_from_scripts(
         pattern: str,
         kwargs: dict[str, Any],
         folders: list[Path],
-        verbosity: int = DEFAULT_VERBOSITY) -> list[Task]:
+        verbosity: int = DEFAULT_VERBOSITY,
+        jobs: int = 1,
+        cache_dir: Path | None = None,
+        manifests: Manifests | None = None) -> list[Task]:
     """Generate tasks from workflows defined by '**/*{script}'."""
-    import rich.progress as progress
-
-    tasks: list[Task] = []
     paths = [path
              for folder in folders
              for path in folder.glob('**/*' + pattern)]
-
-    with progress.Progress('[progress.description]{task.description}',
-                           progress.BarColumn(),
-                           progress.MofNCompleteColumn()) as pb:
-        id = pb.add_task('Reading scripts:', total=len(paths))
-        for path in paths:
-            func = get_workflow_function(path, kwargs)
-            tasks += get_tasks_from_folder(path.parent, func, path.absolute())
-            pb.advance(id)
-
-    return tasks
+    return collect_from_folders([(path, path.parent) for path in paths],
+                                kwargs,
+                                'Reading scripts:',
+                                jobs,
+                                cache_dir,
+                                manifests)
 
 
 def workflow_from_script(script: Path,
                          kwargs: dict[str, Any],
                          folders: list[Path],
-                         verbosity: int = DEFAULT_VERBOSITY) -> list[Task]:
+                         verbosity: int = DEFAULT_VERBOSITY,
+                         jobs: int = 1,
+                         cache_dir: Path | None = None,
+                         manifests: Manifests | None = None) -> list[Task]:
     """Collect tasks from workflow defined in python script."""
-    import rich.progress as progress
+    return collect_from_folders([(script, folder) for folder in folders],
+                                kwargs,
+                                'Scanning folders:',
+                                jobs,
+                                cache_dir,
+                                manifests)
 
-    func = get_workflow_function(script, kwargs)
+
+def collect_from_folders(scripts_and_folders: list[tuple[Path, Path]],
+                         kwargs: dict[str, Any],
+                         description: str,
+                         jobs: int = 1,
+                         cache_dir: Path | None = None,
+                         manifests: Manifests | None = None) -> list[Task]:
+    """Collect tasks from (script, folder) pairs.
+
+    With *jobs* > 1, the folders are divided among a pool of processes.
+    Each process has its own runner and returns task descriptions
+    that are converted back to Task objects in the original order.
+    """
+    import rich.progress as progress
 
     tasks: list[Task] = []
 
+    if manifests is not None:
+        unchanged = manifests.unchanged(scripts_and_folders)
+        if any(unchanged):
+            print('Skipping', plural(sum(unchanged), 'unchanged folder'))
+            scripts_and_folders = [
+                pair
+                for pair, skip in zip(scripts_and_folders, unchanged)
+                if not skip]
+
     with progress.Progress('[progress.description]{task.description}',
                            progress.BarColumn(),
                            progress.MofNCompleteColumn()) as pb:
-        id = pb.add_task('Scanning folders:', total=len(folders))
-        for folder in folders:
-            tasks += get_tasks_from_folder(folder, func, script.absolute())
-            pb.advance(id)
+        id = pb.add_task(description, total=len(scripts_and_folders))
+        if jobs == 1:
+            functions: dict[Path, WorkflowFunction] = {}
+            for script, folder in scripts_and_folders:
+                if script not in functions:
+                    functions[script] = get_workflow_function(
+                        script, kwargs, cache_dir)
+                new = get_tasks_from_folder(folder,
+                                            functions[script],
+                                            script.absolute())
+                if manifests is not None:
+                    manifests.add(script, folder, new)
+                tasks += new
+                pb.advance(id)
+            return tasks
+
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        pairs = [(script.absolute(), folder.absolute())
+                 for script, folder in scripts_and_folders]
+        size = max(1, min(50, len(pairs) // (4 * jobs)))
+        chunks = [pairs[i:i + size] for i in range(0, len(pairs), size)]
+        # Don't fork: the progress-bar thread may be holding a lock
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(jobs, mp_context=context) as pool:
+            results = pool.map(task_descriptions_from_folders,
+                               chunks,
+                               [kwargs] * len(chunks),
+                               [cache_dir] * len(chunks))
+            for chunk, result in zip(chunks, results):
+                for (script, folder), dcts in zip(chunk, result):
+                    new = [Task.fromdict(dct, Path('/')) for dct in dcts]
+                    if manifests is not None:
+                        manifests.add(script, folder, new)
+                    tasks += new
+                pb.advance(id, len(chunk))
 
     return tasks
 
 
+def task_descriptions_from_folders(
+        scripts_and_folders: list[tuple[Path, Path]],
+        kwargs: dict[str, Any],
+        cache_dir: Path | None = None) -> list[list[dict[str, Any]]]:
+    """Collect tasks in a worker process.
+
+    Returns picklable dictionaries (see :meth:`Task.todict`) for each
+    folder.
+    """
+    functions: dict[Path, WorkflowFunction] = {}
+    result = []
+    for script, folder in scripts_and_folders:
+        if script not in functions:
+            functions[script] = get_workflow_function(
+                script, kwargs, cache_dir)
+        tasks = get_tasks_from_folder(folder, functions[script], script)
+        result.append([task.todict() for task in tasks])
+    return result
+
+
 def filter_tasks(tasks: list[Task], names: list[str]) -> list[Task]:
     """Filter tasks that are not in names or in dependencies of names."""
     include = set()
@@ -243,7 +394,7 @@ class RunHandle:
     @property
     def done(self) -> bool:
         """Has task been successfully finished?"""
-        return self.task.state == State.done
+        return self.task.state is State.done
 
     def __enter__(self) -> RunHandle:
         self.runner.dependencies.append(self.task)
@@ -325,6 +476,8 @@ class Runner:
                                 'weight': -1}
         self.target = ''
         self.workflow_script: Path | None = None
+        # Absolute paths of folders seen while collecting:
+        self.folders: dict[Path | str, Path] = {}
 
     def run(self,
             *,
@@ -406,7 +559,7 @@ class Runner:
                            kwargs,
                            dependencies,
                            self.workflow_script,
-                           Path(folder).absolute(),
+                           self.absolute_folder(folder),
                            resource_kwargs.pop('restart'),  # type: ignore
                            creates=creates,
                            script_commands=script_commands,
@@ -417,17 +570,26 @@ class Runner:
                 task.run()
                 raise StopRunning
         elif self.tasks is not None:
-            if task.state != State.done:
+            if task.state is not State.done:
                 self.tasks.append(task)
         else:
             task.run()
 
         return RunHandle(task, self)
 
+    def absolute_folder(self, folder: Path | str) -> Path:
+        """Absolute path (shared by all tasks in the same folder)."""
+        path = self.folders.get(folder)
+        if path is None:
+            path = Path(folder).absolute()
+            if self.tasks is not None:
+                self.folders[folder] = path
+        return path
+
     def extract_dependencies(self,
                              args: Sequence[Any],
                              kwargs: dict[str, Any],
-                             deps: list[RunHandle]) -> list[Path]:
+                             deps: list[RunHandle]) -> Sequence[Path]:
         """Find dependencies on other tasks."""
         tasks = set(self.dependencies)
         for handle in deps:
@@ -435,7 +597,7 @@ class Runner:
         for thing in list(args) + list(kwargs.values()):
             if isinstance(thing, Result):
                 tasks.add(thing.task)
-        return [task.dname for task in tasks]
+        return [task.dname for task in tasks] or EMPTY
 
     def wrap(self, function: Callable, **run_kwargs: Any) -> Callable:
         """Wrap a function as a task.
@@ -501,7 +663,7 @@ def create_task(function: Callable = None,
                 name: str = '',
                 args: Sequence[Any] = [],
                 kwargs: dict[str, Any] = {},
-                deps: list[Path] = [],
+                deps: Sequence[Path] = EMPTY,
                 workflow_script: Path = None,
                 folder: Path = Path('.'),
                 restart: int = 0,
@@ -518,24 +680,24 @@ def create_task(function: Callable = None,
     if function:
         name = name or get_name(function)
         cached_function = json_cached_function(function, name, args, kwargs)
-        command = WorkflowTask(f'{workflow_script}:{name}', [],
+        command = WorkflowTask(f'{workflow_script}:{name}', EMPTY,
                                cached_function)
         creates = creates + [f'{name}.result']
     elif module:
         assert not kwargs
-        command = PythonModule(module, [str(arg) for arg in args])
+        command = PythonModule(module, str_args(args))
     elif script:
         assert not kwargs
         path = folder / script
         assert path.is_file(), path
         if path.suffix == '.py':
-            command = PythonScript(str(path), [str(arg) for arg in args])
+            command = PythonScript(str(path), str_args(args))
         else:
-            command = ShellScript(str(path), [str(arg) for arg in args])
+            command = ShellScript(str(path), str_args(args))
     else:
         assert not kwargs
         assert isinstance(shell, str)
-        command = ShellCommand('shell:' + shell, [str(arg) for arg in args])
+        command = ShellCommand('shell:' + shell, str_args(args))
 
     if name:
         command.set_non_standard_name(name)
@@ -564,10 +726,16 @@ def create_task(function: Callable = None,
     return task
 
 
+def str_args(args: Sequence[Any]) -> Sequence[str]:
+    """Convert arguments to strings (shared empty tuple if no arguments)."""
+    return [str(arg) for arg in args] or EMPTY
+
+
 def collect(workflow_function: Callable,
             script: Path) -> list[Task]:
     """Collecting tasks from workflow function."""
     runner.tasks = []
+    runner.folders = {}
     runner.workflow_script = script
     try:
         workflow_function()
@@ -576,6 +744,7 @@ def collect(workflow_function: Callable,
 
     tasks = runner.tasks
     runner.tasks = None
+    runner.folders = {}
     return tasks
 
 